@@ -1,3 +1,9 @@
+import os
+
+# Thread pools read these at load time, so they must be set before torch/CTranslate2 are imported
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 2) // 2)))
+os.environ.setdefault("MKL_NUM_THREADS", os.environ["OMP_NUM_THREADS"])
+
 import torch
 from typing import Literal
 
@@ -17,17 +23,22 @@ class Config:
     # Device settings - auto detect GPU/CPU
     DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
     COMPUTE_TYPE = "float16" if torch.cuda.is_available() else "int8"
+    COMPUTE_TYPE_FINAL = "int8_float16" if torch.cuda.is_available() else "int8"  # int8 weights for the larger final model
+    CPU_THREADS = int(os.environ["OMP_NUM_THREADS"])  # CTranslate2 threads per model on CPU
     
     # Audio settings
     SAMPLE_RATE = 16000
+    CHUNK_SIZE = 512  # Samples per audio frame sent by the client (~32ms)
     
     # VAD (Voice Activity Detection) settings
     SILENCE_THRESHOLD = 800     # RMS threshold for speech detection (adjust based on mic)
     MIN_SPEECH_FRAMES = 15      # Minimum frames to consider as speech
     SILENCE_COUNT_THRESHOLD = 80 # Frames of silence before ending speech (~4 seconds)
+    VAD_BATCH_FRAMES = 1        # Frames classified per VAD call (>1 delays decisions by up to N-1 frames)
     
     # Transcription timing
     PARTIAL_INTERVAL = 1.5      # Seconds between partial transcriptions
+    PARTIAL_WINDOW_FRAMES = 60  # Most recent frames used for partial transcription
     MIN_AUDIO_LENGTH = 0.3      # Minimum audio length (seconds) to transcribe
     TRANSCRIPTION_TIMEOUT = 30  # Max seconds to wait for transcription
     
@@ -46,9 +57,11 @@ class Config:
     MAX_CONNECTIONS = 1  # Only allow 1 connection at a time
     PING_INTERVAL = 20   # Ping every 20 seconds
     PING_TIMEOUT = 10    # Wait 10 seconds for pong
+    SEND_QUEUE_SIZE = 128  # Outgoing messages buffered per client before partials are dropped
     
     # Buffer settings
     MAX_AUDIO_BUFFER = 300  # Maximum audio buffer size (~10 seconds)
+    MAX_SPEECH_FRAMES = 900  # Longest utterance before a final is forced (~29 seconds, within Whisper's 30s window)
     
     @classmethod
     def log_config(cls):
@@ -56,6 +69,7 @@ class Config:
         return {
             "device": cls.DEVICE,
             "compute_type": cls.COMPUTE_TYPE,
+            "compute_type_final": cls.COMPUTE_TYPE_FINAL,
             "partial_model": cls.PARTIAL_MODEL_SIZE,
             "final_model": cls.FINAL_MODEL_SIZE,
             "language": cls.LANGUAGE,
@@ -46,14 +46,13 @@ async def debug_client():
                 try:
                     chunk_count = 0
                     while True:
-                        data = stream.read(CHUNK, exception_on_overflow=False)
+                        # Blocking read paces the loop at the mic rate; run it off the event loop
+                        data = await asyncio.to_thread(stream.read, CHUNK, exception_on_overflow=False)
                         await websocket.send(data)
                         
                         chunk_count += 1
                         if chunk_count % 100 == 0:  # Every ~3 seconds
                             print(f"📡 Sent {chunk_count} audio chunks ({chunk_count * 30}ms)")
-                        
-                        await asyncio.sleep(0.03)  # ~30ms
                 except Exception as e:
                     print(f"❌ Audio streaming error: {e}")
             
@@ -127,6 +127,11 @@ if __name__ == "__main__":
         "main:app",
         host=Config.HOST,
         port=Config.PORT,
+        loop="auto",        # uvloop (libuv) when installed, asyncio otherwise (e.g. Windows)
+        http="httptools",
+        ws="websockets",
+        ws_ping_interval=Config.PING_INTERVAL,
+        ws_ping_timeout=Config.PING_TIMEOUT,
         log_level="info" if Config.VERBOSE else "warning",
         access_log=Config.VERBOSE,
         reload=False
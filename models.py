@@ -1,28 +1,52 @@
+import json
+from dataclasses import dataclass
 from pydantic import BaseModel
 from typing import Literal, Optional
-from datetime import datetime
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 class AudioMessage(BaseModel):
     """Audio data message from client"""
     action: Literal["start", "stop", "audio"]
     data: Optional[bytes] = None
 
-class TranscriptionResponse(BaseModel):
-    """Response message to client"""
+@dataclass(slots=True)
+class TranscriptionResponse:
+    """Response message to client (plain dataclass, built on every audio event)"""
     type: Literal["partial", "final", "speech_start", "speech_end", "error", "status"]
-    text: Optional[str] = None
     timestamp: str
+    text: Optional[str] = None
     confidence: Optional[float] = None
     error_message: Optional[str] = None
     
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
+    def to_dict(self) -> dict:
+        """Wire representation, in the documented field order"""
+        return {
+            "type": self.type,
+            "text": self.text,
+            "timestamp": self.timestamp,
+            "confidence": self.confidence,
+            "error_message": self.error_message
         }
+    
+    def to_json(self) -> str:
+        """Serialize for the WebSocket"""
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(self.to_dict()).decode()
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+    
+    def to_json_bytes(self) -> bytes:
+        """Serialize to UTF-8 for binary WebSocket frames"""
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(self.to_dict())
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":")).encode()
 
-class ConnectionStatus(BaseModel):
-    """Connection status tracking"""
+@dataclass(slots=True)
+class ConnectionStatus:
+    """Connection identity (per-frame counters live on the handler)"""
     client_id: str
-    connected_at: datetime
-    is_speaking: bool = False
-    frames_processed: int = 0
\ No newline at end of file
+    connected_at: str  # ISO timestamp, formatted once on connect
@@ -1,11 +1,12 @@
 import asyncio
+import re
 import numpy as np
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 from faster_whisper import WhisperModel
-from datetime import datetime
 
 from config import Config
 from models import TranscriptionResponse
+from utils import now_iso
 from utils.logger_config import LOGGER
 
 class STTService:
@@ -14,36 +15,41 @@ class STTService:
     def __init__(self):
         self.partial_model: Optional[WhisperModel] = None
         self.final_model: Optional[WhisperModel] = None
-        self._model_lock = asyncio.Lock()
+        
+        # Separate locks so a long final decode doesn't block the next partial
+        self._partial_lock = asyncio.Lock()
+        self._final_lock = asyncio.Lock()
+        
+        # Reusable float32 buffers for int16 -> float32 conversion, each guarded by its model lock
+        self._partial_buf = np.empty(Config.PARTIAL_WINDOW_FRAMES * Config.CHUNK_SIZE, dtype=np.float32)
+        self._final_buf = np.empty(Config.MAX_SPEECH_FRAMES * Config.CHUNK_SIZE, dtype=np.float32)
+        self._min_audio_bytes = int(Config.MIN_AUDIO_LENGTH * Config.SAMPLE_RATE * 2)  # 2 bytes per sample
+        
+        # Single case-insensitive pattern for all hallucination phrases
+        self._suppress_re = re.compile(
+            "|".join(re.escape(phrase) for phrase in Config.SUPPRESS_PHRASES),
+            re.IGNORECASE
+        ) if Config.SUPPRESS_PHRASES else None
         
     async def initialize_models(self):
         """Initialize Whisper models"""
         try:
             if Config.VERBOSE:
                 LOGGER.info("Initializing Whisper models...")
-                LOGGER.info(f"Device: {Config.DEVICE}, Compute type: {Config.COMPUTE_TYPE}")
+                LOGGER.info(f"Device: {Config.DEVICE}, Compute type: {Config.COMPUTE_TYPE} (partial), {Config.COMPUTE_TYPE_FINAL} (final)")
             
             # Initialize partial model (fast)
-            self.partial_model = WhisperModel(
-                Config.PARTIAL_MODEL_SIZE,
-                device=Config.DEVICE,
-                compute_type=Config.COMPUTE_TYPE,
-                download_root=None,
-                local_files_only=False
-            )
+            self.partial_model = self._load_model(Config.PARTIAL_MODEL_SIZE, Config.COMPUTE_TYPE)
             
             # Initialize final model (accurate)
             if Config.FINAL_MODEL_SIZE != Config.PARTIAL_MODEL_SIZE:
-                self.final_model = WhisperModel(
-                    Config.FINAL_MODEL_SIZE,
-                    device=Config.DEVICE,
-                    compute_type=Config.COMPUTE_TYPE,
-                    download_root=None,
-                    local_files_only=False
-                )
+                self.final_model = self._load_model(Config.FINAL_MODEL_SIZE, Config.COMPUTE_TYPE_FINAL)
             else:
                 self.final_model = self.partial_model
             
+            # Pay one-time kernel/allocator initialization before the first client request
+            self._warmup_models()
+            
             if Config.VERBOSE:
                 LOGGER.info(f"Models initialized: {Config.PARTIAL_MODEL_SIZE} (partial), {Config.FINAL_MODEL_SIZE} (final)")
             
@@ -51,56 +57,83 @@ class STTService:
             LOGGER.error(f"Failed to initialize models: {e}")
             raise
     
+    def _load_model(self, model_size: str, compute_type: str) -> WhisperModel:
+        """Create a Whisper model for the configured device"""
+        # Avoid oversubscribing cores on CPU (CTranslate2 defaults to all hardware threads)
+        cpu_options = {"cpu_threads": Config.CPU_THREADS, "num_workers": 1} if Config.DEVICE == "cpu" else {}
+        
+        return WhisperModel(
+            model_size,
+            device=Config.DEVICE,
+            compute_type=compute_type,
+            download_root=None,
+            local_files_only=False,
+            **cpu_options
+        )
+    
+    def _warmup_models(self):
+        """Run a silent transcription through both decoding paths"""
+        warmup_audio = np.zeros(Config.SAMPLE_RATE, dtype=np.float32)  # 1 second of silence
+        
+        # Results are discarded; _transcribe_sync already logs and swallows errors
+        self._transcribe_sync(self.partial_model, warmup_audio, True)
+        self._transcribe_sync(self.final_model, warmup_audio, False)
+        
+        if Config.VERBOSE:
+            LOGGER.info("Models warmed up")
+    
     def _suppress_hallucinations(self, text: str) -> Tuple[str, bool]:
         """
         Remove common hallucination patterns
         Returns: (cleaned_text, was_suppressed)
         """
-        if not text or not text.strip():
+        if not text or text.isspace():
             return text, False
         
-        text_lower = text.lower()
-        
         # Check for suppression phrases
-        for phrase in Config.SUPPRESS_PHRASES:
-            if phrase.lower() in text_lower:
-                if Config.VERBOSE:
-                    LOGGER.warning(f"Suppressed hallucination: '{text}'")
-                return "", True
+        if self._suppress_re and self._suppress_re.search(text):
+            if Config.VERBOSE:
+                LOGGER.warning(f"Suppressed hallucination: '{text}'")
+            return "", True
         
         # Check for repetitive patterns (same phrase repeated)
         words = text.split()
-        if len(words) > 4:
-            # Simple repetition detection
-            for i in range(len(words) - 2):
-                word_sequence = " ".join(words[i:i+3])
-                remaining_text = " ".join(words[i+3:])
-                if word_sequence in remaining_text:
-                    if Config.VERBOSE:
-                        LOGGER.warning(f"Suppressed repetitive text: '{text}'")
-                    return "", True
+        if len(words) > 4 and self._has_repeated_trigram(words):
+            if Config.VERBOSE:
+                LOGGER.warning(f"Suppressed repetitive text: '{text}'")
+            return "", True
         
         return text, False
     
-    def _prepare_audio(self, audio_frames: List[bytes]) -> Optional[np.ndarray]:
-        """Convert audio frames to numpy array for transcription"""
+    @staticmethod
+    def _has_repeated_trigram(words: List[str]) -> bool:
+        """Check if any 3-word sequence appears again after itself, in a single pass"""
+        first_seen = {}
+        for i, trigram in enumerate(zip(words, words[1:], words[2:])):
+            if i - first_seen.setdefault(trigram, i) >= 3:
+                return True
+        return False
+    
+    def _prepare_audio(self, pcm_view: Union[bytes, memoryview], is_partial: bool) -> Optional[np.ndarray]:
+        """Convert 16-bit PCM audio to numpy array for transcription"""
         try:
-            if not audio_frames:
-                return None
-            
-            # Combine all frames
-            audio_data = b''.join(audio_frames)
+            # Wrap the PCM bytes without copying
+            audio_array = np.frombuffer(pcm_view, dtype=np.int16)
+            n = audio_array.size
             
-            # Check minimum length
-            min_bytes = int(Config.MIN_AUDIO_LENGTH * Config.SAMPLE_RATE * 2)  # 2 bytes per sample
-            if len(audio_data) < min_bytes:
-                return None
+            # Grow the conversion buffer for long utterances
+            buf = self._partial_buf if is_partial else self._final_buf
+            if n > buf.size:
+                buf = np.empty(n, dtype=np.float32)
+                if is_partial:
+                    self._partial_buf = buf
+                else:
+                    self._final_buf = buf
             
-            # Convert to numpy array
-            audio_array = np.frombuffer(audio_data, dtype=np.int16)
-            
-            # Convert to float32 in range [-1, 1]
-            audio_float = audio_array.astype(np.float32) / 32768.0
+            # Convert to float32 in range [-1, 1] in a single pass, without temporaries.
+            # Kept on CPU even with CUDA: faster-whisper computes mel features from a numpy array
+            audio_float = buf[:n]
+            np.multiply(audio_array, np.float32(1.0 / 32768.0), out=audio_float, casting='unsafe')
             
             return audio_float
             
@@ -108,30 +141,35 @@ class STTService:
             LOGGER.error(f"Error preparing audio: {e}")
             return None
     
-    async def transcribe_partial(self, audio_frames: List[bytes]) -> TranscriptionResponse:
+    @staticmethod
+    def _error_response(error_message: str) -> TranscriptionResponse:
+        """Build an error response for the client"""
+        return TranscriptionResponse(
+            type="error",
+            timestamp=now_iso(),
+            error_message=error_message
+        )
+    
+    async def transcribe_partial(self, pcm_view: Union[bytes, memoryview]) -> TranscriptionResponse:
         """Perform fast partial transcription"""
+        # Reject undersized audio without waiting for the model
+        if len(pcm_view) < self._min_audio_bytes:
+            return self._error_response("Invalid audio data")
+        
         try:
-            audio_data = self._prepare_audio(audio_frames)
-            if audio_data is None:
-                return TranscriptionResponse(
-                    type="error",
-                    timestamp=datetime.now().isoformat(),
-                    error_message="Invalid audio data"
-                )
-            
-            async with self._model_lock:
-                # Use timeout for transcription
-                transcription_task = asyncio.create_task(
-                    asyncio.to_thread(self._transcribe_sync, self.partial_model, audio_data, True)
-                )
+            async with self._partial_lock:
+                # Prepare under the lock since the conversion buffer is reused
+                audio_data = self._prepare_audio(pcm_view, True)
+                if audio_data is None:
+                    return self._error_response("Invalid audio data")
                 
+                # Use timeout for transcription
                 try:
                     text, confidence = await asyncio.wait_for(
-                        transcription_task, 
+                        asyncio.to_thread(self._transcribe_sync, self.partial_model, audio_data, True),
                         timeout=Config.TRANSCRIPTION_TIMEOUT
                     )
                 except asyncio.TimeoutError:
-                    transcription_task.cancel()
                     raise Exception("Partial transcription timeout")
             
             # Suppress hallucinations
@@ -141,7 +179,7 @@ class STTService:
                 return TranscriptionResponse(
                     type="partial",
                     text="",
-                    timestamp=datetime.now().isoformat(),
+                    timestamp=now_iso(),
                     confidence=0.0
                 )
             
@@ -151,42 +189,34 @@ class STTService:
             return TranscriptionResponse(
                 type="partial",
                 text=cleaned_text.strip(),
-                timestamp=datetime.now().isoformat(),
+                timestamp=now_iso(),
                 confidence=confidence
             )
             
         except Exception as e:
             LOGGER.error(f"Partial transcription error: {e}")
-            return TranscriptionResponse(
-                type="error",
-                timestamp=datetime.now().isoformat(),
-                error_message=f"Partial transcription failed: {str(e)}"
-            )
+            return self._error_response(f"Partial transcription failed: {str(e)}")
     
-    async def transcribe_final(self, audio_frames: List[bytes]) -> TranscriptionResponse:
+    async def transcribe_final(self, pcm_view: memoryview) -> TranscriptionResponse:
         """Perform accurate final transcription"""
+        # Reject undersized audio without waiting for the model
+        if len(pcm_view) < self._min_audio_bytes:
+            return self._error_response("Invalid audio data")
+        
         try:
-            audio_data = self._prepare_audio(audio_frames)
-            if audio_data is None:
-                return TranscriptionResponse(
-                    type="error",
-                    timestamp=datetime.now().isoformat(),
-                    error_message="Invalid audio data"
-                )
-            
-            async with self._model_lock:
-                # Use timeout for transcription
-                transcription_task = asyncio.create_task(
-                    asyncio.to_thread(self._transcribe_sync, self.final_model, audio_data, False)
-                )
+            async with self._final_lock:
+                # Prepare under the lock since the conversion buffer is reused
+                audio_data = self._prepare_audio(pcm_view, False)
+                if audio_data is None:
+                    return self._error_response("Invalid audio data")
                 
+                # Use timeout for transcription
                 try:
                     text, confidence = await asyncio.wait_for(
-                        transcription_task,
+                        asyncio.to_thread(self._transcribe_sync, self.final_model, audio_data, False),
                         timeout=Config.TRANSCRIPTION_TIMEOUT
                     )
                 except asyncio.TimeoutError:
-                    transcription_task.cancel()
                     raise Exception("Final transcription timeout")
             
             # Suppress hallucinations
@@ -201,23 +231,19 @@ class STTService:
             return TranscriptionResponse(
                 type="final",
                 text=cleaned_text.strip(),
-                timestamp=datetime.now().isoformat(),
+                timestamp=now_iso(),
                 confidence=confidence
             )
             
         except Exception as e:
             LOGGER.error(f"Final transcription error: {e}")
-            return TranscriptionResponse(
-                type="error",
-                timestamp=datetime.now().isoformat(),
-                error_message=f"Final transcription failed: {str(e)}"
-            )
+            return self._error_response(f"Final transcription failed: {str(e)}")
     
     def _transcribe_sync(self, model: WhisperModel, audio_data: np.ndarray, is_partial: bool) -> Tuple[str, float]:
         """Synchronous transcription wrapper"""
         try:
             # Configure transcription parameters
-            beam_size = 1 if is_partial else 5
+            beam_size = 1 if is_partial else 3
             best_of = 1 if is_partial else 1
             temperature = 0.0
             
@@ -227,29 +253,29 @@ class STTService:
                 beam_size=beam_size,
                 best_of=best_of,
                 temperature=temperature,
+                without_timestamps=is_partial,  # Partials don't need timestamp tokens
+                condition_on_previous_text=not is_partial,
                 vad_filter=False,  # We handle VAD ourselves
                 vad_parameters=None
             )
             
-            # Combine all segments
-            full_text = ""
-            total_confidence = 0.0
-            segment_count = 0
+            # Combine all segments, collecting log probs for a single vectorized average
+            text_parts = []
+            logprobs = []
             
             for segment in segments:
-                full_text += segment.text + " "
+                text_parts.append(segment.text)
                 if hasattr(segment, 'avg_logprob'):
-                    total_confidence += segment.avg_logprob
-                    segment_count += 1
+                    logprobs.append(segment.avg_logprob)
             
             # Calculate average confidence (convert from log prob to 0-1)
-            if segment_count > 0:
-                avg_confidence = total_confidence / segment_count
-                confidence = max(0.0, min(1.0, (avg_confidence + 1.0)))  # Rough conversion
+            if logprobs:
+                avg_confidence = np.mean(np.asarray(logprobs, dtype=np.float32))
+                confidence = float(np.clip(avg_confidence + 1.0, 0.0, 1.0))  # Rough conversion
             else:
                 confidence = 0.0
             
-            return full_text.strip(), confidence
+            return " ".join(text_parts).strip(), confidence
             
         except Exception as e:
             LOGGER.error(f"Sync transcription error: {e}")
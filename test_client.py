@@ -37,9 +37,9 @@ async def test_client():
             async def send_audio():
                 try:
                     while True:
-                        data = stream.read(CHUNK, exception_on_overflow=False)
+                        # Blocking read paces the loop at the mic rate; run it off the event loop
+                        data = await asyncio.to_thread(stream.read, CHUNK, exception_on_overflow=False)
                         await websocket.send(data)
-                        await asyncio.sleep(0.03)  # ~30ms
                 except Exception as e:
                     print(f"Audio streaming error: {e}")
             
@@ -1,6 +1,7 @@
 import contextlib
 import platform
 import threading
+import time
 
 
 def emojis(str=''):
@@ -8,6 +9,21 @@ def emojis(str=''):
     return str.encode().decode('ascii', 'ignore') if platform.system() == 'Windows' else str
 
 
+_iso_cache = (None, '')  # (epoch second, formatted 'YYYY-MM-DDTHH:MM:SS' prefix)
+
+
+def now_iso():
+    # Return local time as ISO 8601 with microseconds, formatting the date/time prefix at most once per second
+    global _iso_cache
+    t = time.time()
+    s = int(t)
+    second, prefix = _iso_cache
+    if s != second:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(s))
+        _iso_cache = (s, prefix)
+    return f'{prefix}.{int((t - s) * 1e6):06d}'
+
+
 class TryExcept(contextlib.ContextDecorator):
     # YOLOv5 TryExcept class. Usage: @TryExcept() decorator or 'with TryExcept():' context manager
     def __init__(self, msg=''):
@@ -3,24 +3,38 @@ import math
 import os
 import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from threading import Thread
-from urllib.parse import urlparse
+from threading import Event, Lock, Thread
 import cv2
 import numpy as np
-import re
 from utils.logger_config import LOGGER
-import json
-import subprocess
 
 # Parameters
-IMG_FORMATS = 'bmp', 'dng', 'jpeg', 'jpg', 'mpo', 'png', 'tif', 'tiff', 'webp', 'pfm'  # include image suffixes
-VID_FORMATS = 'asf', 'avi', 'gif', 'm4v', 'mkv', 'mov', 'mp4', 'mpeg', 'mpg', 'ts', 'wmv'  # include video suffixes
+IMG_FORMATS = frozenset({'.bmp', '.dng', '.jpeg', '.jpg', '.mpo', '.png', '.tif', '.tiff', '.webp', '.pfm'})  # include image suffixes
+VID_FORMATS = frozenset({'.asf', '.avi', '.gif', '.m4v', '.mkv', '.mov', '.mp4', '.mpeg', '.mpg', '.ts', '.wmv'})  # include video suffixes
+_CLEAN_TABLE = str.maketrans(dict.fromkeys("|@#!¡·$€%&()=?¿^*;:,¨´><+", "_"))  # special characters -> _
 
 
 def clean_str(s):
     # Cleans a string by replacing special characters with underscore _
-    return re.sub(pattern="[|@#!¡·$€%&()=?¿^*;:,¨´><+]", repl="_", string=s)
+    return s.translate(_CLEAN_TABLE)
+
+
+def imread(path):
+    # Read an image file and decode it separately so the work can run in a thread pool (also handles unicode paths)
+    try:
+        buf = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return None
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR) if buf.size else None  # BGR
+
+
+def preprocess_image(im, size=(640, 640)):
+    # Resize + BGR->RGB + /255 + HWC->CHW in one OpenCV call, returns a contiguous float32 (3, h, w) array
+    # size is (w, h); replaces separate cvtColor/resize/transpose/ascontiguousarray passes over the image
+    return cv2.dnn.blobFromImage(im, scalefactor=1 / 255.0, size=size, swapRB=True, crop=False)[0]
 
 
 def is_colab():
@@ -34,37 +48,53 @@ def is_kaggle():
 
 
 class LoadImages:
-    def __init__(self, path, vid_stride=1):
-        files = []
+    def __init__(self, path, vid_stride=1, prefetch=2):
+        images, videos = [], []
         for p in sorted(path) if isinstance(path, (list, tuple)) else [path]:
             p = str(Path(p).resolve())
             if '*' in p:
-                files.extend(sorted(glob.glob(p, recursive=True)))  # glob
+                files = sorted(glob.iglob(p, recursive=True))  # glob
             elif os.path.isdir(p):
-                files.extend(sorted(glob.glob(os.path.join(p, '*.*'))))  # dir
+                with os.scandir(p) as it:  # dir, skipping hidden entries and subdirectories
+                    files = sorted(e.path for e in it if not e.name.startswith('.') and e.is_file())
             elif os.path.isfile(p):
-                files.append(p)  # files
+                files = [p]  # files
             else:
                 raise FileNotFoundError(f'{p} does not exist')
 
-        images = [x for x in files if x.split('.')[-1].lower() in IMG_FORMATS]
-        videos = [x for x in files if x.split('.')[-1].lower() in VID_FORMATS]
+            # Split into images and videos in a single pass
+            for f in files:
+                ext = os.path.splitext(f)[1].lower()
+                if ext in IMG_FORMATS:
+                    images.append(f)
+                elif ext in VID_FORMATS:
+                    videos.append(f)
         ni, nv = len(images), len(videos)
 
         self.files = images + videos
+        self.ni = ni  # number of images
         self.nf = ni + nv  # number of files
         self.video_flag = [False] * ni + [True] * nv
         self.mode = 'image'
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.prefetch = max(prefetch, 1)  # images read/decoded ahead in background threads
+        self._pool = None
+        self._prefetched = deque()
         if any(videos):
             self._new_video(videos[0])  # new video
         else:
             self.cap = None
         assert self.nf > 0, f'No images or videos found in {p}. ' \
-                            f'Supported formats are:\nimages: {IMG_FORMATS}\nvideos: {VID_FORMATS}'
+                            f'Supported formats are:\nimages: {sorted(IMG_FORMATS)}\nvideos: {sorted(VID_FORMATS)}'
 
     def __iter__(self):
         self.count = 0
+        if self.ni:
+            # Images come first in self.files, so prefetch from the start and keep `prefetch` reads in flight
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.prefetch)
+            self._prefetched = deque(self._pool.submit(imread, f) for f in self.files[:min(self.prefetch, self.ni)])
+            self._next_prefetch = len(self._prefetched)
         return self
 
     def __next__(self):
@@ -94,7 +124,10 @@ class LoadImages:
         else:
             # Read image
             self.count += 1
-            im0 = cv2.imread(path)  # BGR
+            im0 = self._prefetched.popleft().result()  # BGR
+            if self._next_prefetch < self.ni:
+                self._prefetched.append(self._pool.submit(imread, self.files[self._next_prefetch]))
+                self._next_prefetch += 1
             assert im0 is not None, f'Image Not Found {path}'
             s = f'image {self.count}/{self.nf} {path}: '
 
@@ -128,8 +161,11 @@ class LoadStreams:
                  reconnect_attempts=10, 
                  reconnect_delay=5, 
                  timeout=30,
-                 use_gstreamer=True):
+                 use_gstreamer=True,
+                 resolution=None):
         
+        from urllib.parse import urlparse
+
         LOGGER.info(
             f"Initializing LoadStreams with parameters:\n"
             f"→ sources: {sources}\n"
@@ -137,7 +173,8 @@ class LoadStreams:
             f"→ reconnect_attempts: {reconnect_attempts}\n"
             f"→ reconnect_delay: {reconnect_delay}\n"
             f"→ timeout: {timeout}\n"
-            f"→ use_gstreamer: {use_gstreamer}"
+            f"→ use_gstreamer: {use_gstreamer}\n"
+            f"→ resolution: {resolution}"
         )
 
         self.mode = 'stream'
@@ -152,6 +189,7 @@ class LoadStreams:
         self.reconnect_attempts = reconnect_attempts  # Số lần thử kết nối lại
         self.reconnect_delay = reconnect_delay  # Thời gian chờ giữa các lần kết nối lại (giây)
         self.timeout = timeout  # Timeout cho kết nối (giây)
+        self.resolution = resolution  # (width, height) mong muốn cho webcam local, None = để driver tự chọn
         self.connection_status = []  # Trạng thái kết nối cho mỗi stream
         self.last_frame_time = []  # Thời gian nhận frame cuối cùng
         self.reconnecting = []  # Trạng thái đang thử kết nối lại
@@ -164,8 +202,23 @@ class LoadStreams:
         self.connection_status = [True] * n  # Ban đầu giả định tất cả đều kết nối thành công
         self.last_frame_time = [time.time()] * n  # Thời gian nhận frame cuối
         self.reconnecting = [False] * n  # Không stream nào đang kết nối lại ban đầu
+        self._prev_status = [True] * n  # Trạng thái đã báo cho user ở lần __next__ trước
+        self._quit = Event()  # set bởi quit() để dừng vòng lặp
+        self._last_warn = [0.0] * n  # thời điểm (monotonic) warning gần nhất của mỗi stream
+        self._warn_skipped = [0] * n  # số warning bị gộp từ lần log trước
         self.caps = [None] * n  # Lưu lại các đối tượng VideoCapture
         
+        # Triple buffer cho mỗi stream: thread đọc ghi vào _scratch, đẩy sang _pending, __next__ đổi _pending với imgs.
+        # Các buffer được tái sử dụng nên không cấp phát mảng mới mỗi frame
+        self._scratch = [None] * n  # buffer thread đọc đang ghi vào (cấp phát khi retrieve lần đầu)
+        self._pending = [None] * n  # frame hoàn chỉnh mới nhất chưa được lấy
+        self._fresh = [False] * n  # _pending có frame mới chưa
+        self._locks = [Lock() for _ in range(n)]
+        
+        # Cache codec và pipeline GStreamer theo URL để không phải chạy lại ffprobe mỗi lần kết nối lại
+        self._codec_cache = {}  # rtsp_url -> codec
+        self._pipeline_cache = {}  # (rtsp_url, codec) -> pipeline
+        
         for i, s in enumerate(sources):  # index, source
             # Start thread to read frames from video stream
             st = f'{i + 1}/{n}: {s}... '
@@ -174,7 +227,7 @@ class LoadStreams:
                 # check_requirements(('pafy', 'youtube_dl==2020.12.2'))
                 import pafy
                 s = pafy.new(s).getbest(preftype="mp4").url  # YouTube URL
-            s = eval(s) if s.isnumeric() else s  # i.e. s = '0' local webcam
+            s = int(s) if s.isnumeric() else s  # i.e. s = '0' local webcam
             if s == 0:
                 assert not is_colab(), '--source 0 webcam unsupported on Colab. Rerun command in a local environment.'
                 assert not is_kaggle(), '--source 0 webcam unsupported on Kaggle. Rerun command in a local environment.'
@@ -183,21 +236,21 @@ class LoadStreams:
             success, cap = self.create_capture(s, i)
             
             if not success:
-                LOGGER.warning(f'{st}Failed to open {s}. Will retry in background.')
+                LOGGER.warning('%sFailed to open %s. Will retry in background.', st, s)
                 self.connection_status[i] = False
                 self.imgs[i] = np.zeros((640, 640, 3), dtype=np.uint8)  # Tạo khung hình trống
             else:
                 w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
                 h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
                 fps = cap.get(cv2.CAP_PROP_FPS)  # warning: may return 0 or nan
-                LOGGER.info(f"Stream {i}: FPS: {fps}")
+                LOGGER.info("Stream %s: FPS: %s", i, fps)
 
                 self.frames[i] = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0) or float('inf')  # infinite stream fallback
                 self.fps[i] = max((fps if math.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
 
                 _, self.imgs[i] = cap.read()  # guarantee first frame
                 self.caps[i] = cap
-                LOGGER.info(f"{st} Success ({self.frames[i]} frames {w}x{h} at {self.fps[i]:.2f} FPS)")
+                LOGGER.info("%s Success (%s frames %sx%s at %.2f FPS)", st, self.frames[i], w, h, self.fps[i])
             
             # Luôn tạo thread, ngay cả khi kết nối ban đầu thất bại
             self.threads[i] = Thread(target=self.update, args=([i, cap, s]), daemon=True)
@@ -205,7 +258,7 @@ class LoadStreams:
 
     def detect_codec_ffmpeg(self, rtsp_url):
         """
-        Sử dụng ffprobe để phát hiện codec của luồng RTSP
+        Sử dụng PyAV (libav trong tiến trình, không chạy ffprobe) để phát hiện codec của luồng RTSP
         
         Args:
             rtsp_url (str): URL của luồng RTSP
@@ -213,37 +266,34 @@ class LoadStreams:
         Returns:
             str: 'h264', 'h265', hoặc None nếu không phát hiện được
         """
+        if rtsp_url in self._codec_cache:
+            return self._codec_cache[rtsp_url]
+        
+        import av  # chỉ cần cho luồng RTSP, không load khi chỉ dùng LoadImages
+        
         try:
-            LOGGER.info(f"Đang phát hiện codec cho {rtsp_url}...")
-            # Chạy ffprobe để lấy thông tin codec
-            cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_streams",
-                "-select_streams", "v:0",
-                "-print_format", "json",
-                rtsp_url
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            data = json.loads(result.stdout)
-            
-            # Lấy tên codec từ luồng video
-            codec_name = data.get("streams", [{}])[0].get("codec_name", "").lower()
-            LOGGER.info(f"Phát hiện codec: {codec_name}")
+            LOGGER.info("Đang phát hiện codec cho %s...", rtsp_url)
+            # Mở luồng chỉ để đọc header, timeout (mở, đọc) tính bằng giây
+            with av.open(rtsp_url, timeout=(5, 5)) as container:
+                # Lấy tên codec từ luồng video
+                codec_name = container.streams.video[0].codec_context.name.lower()
+            LOGGER.info("Phát hiện codec: %s", codec_name)
             
             if codec_name in ["h264", "avc", "avc1"]:
+                self._codec_cache[rtsp_url] = "h264"
                 return "h264"
             elif codec_name in ["h265", "hevc"]:
+                self._codec_cache[rtsp_url] = "h265"
                 return "h265"
             else:
-                LOGGER.warning(f"Không hỗ trợ codec: {codec_name}")
+                LOGGER.warning("Không hỗ trợ codec: %s", codec_name)
                 return None
                 
-        except subprocess.TimeoutExpired:
-            LOGGER.error(f"Hết thời gian chờ khi phát hiện codec cho {rtsp_url}")
+        except av.error.ExitError:
+            LOGGER.error("Hết thời gian chờ khi phát hiện codec cho %s", rtsp_url)
             return None
         except Exception as e:
-            LOGGER.error(f"Lỗi khi phát hiện codec: {str(e)}")
+            LOGGER.error("Lỗi khi phát hiện codec: %s", e)
             return None
 
     def create_pipeline_for_codec(self, rtsp_url, codec=None):
@@ -261,6 +311,10 @@ class LoadStreams:
         if codec is None:
             codec = self.detect_codec_ffmpeg(rtsp_url)
         
+        pipeline = self._pipeline_cache.get((rtsp_url, codec))
+        if pipeline is not None:
+            return pipeline
+        
         # Phần đầu của pipeline là giống nhau
         base_pipeline = f"rtspsrc location={rtsp_url} latency=0 protocols=tcp drop-on-latency=true ! "
         
@@ -271,25 +325,31 @@ class LoadStreams:
                 "videoconvert ! video/x-raw, format=BGR ! "
                 "appsink drop=1 max-buffers=1 max-lateness=0 sync=false"
             )
-            LOGGER.info(f"Sử dụng pipeline H264: {pipeline}")
+            LOGGER.info("Sử dụng pipeline H264: %s", pipeline)
         elif codec == "h265":
             pipeline = (
                 f"{base_pipeline}rtph265depay ! h265parse ! avdec_h265 max-threads=4 ! "
                 "videoconvert ! video/x-raw, format=BGR ! "
                 "appsink drop=1 max-buffers=1 max-lateness=0 sync=false"
             )
-            LOGGER.info(f"Sử dụng pipeline H265: {pipeline}")
+            LOGGER.info("Sử dụng pipeline H265: %s", pipeline)
         else:
             # Mặc định sử dụng H264 nếu không phát hiện được codec
-            LOGGER.warning(f"Không phát hiện được codec, sử dụng H264 làm mặc định")
+            LOGGER.warning("Không phát hiện được codec, sử dụng H264 làm mặc định")
             pipeline = (
                 f"{base_pipeline}rtph264depay ! h264parse ! avdec_h264 max-threads=4 ! "
                 "videoconvert ! video/x-raw, format=BGR ! "
                 "appsink drop=1 max-buffers=1 max-lateness=0 sync=false"
             )
         
+        self._pipeline_cache[(rtsp_url, codec)] = pipeline
         return pipeline
 
+    def invalidate_pipeline_cache(self, rtsp_url):
+        """Xóa codec/pipeline đã cache của một URL (vd. camera đổi codec) để lần kết nối sau phát hiện lại"""
+        codec = self._codec_cache.pop(rtsp_url, None)
+        self._pipeline_cache.pop((rtsp_url, codec), None)
+
     def create_gstreamer_pipeline(self, source, index):
         """
         Tạo pipeline GStreamer tối ưu cho độ trễ thấp và tự động phát hiện codec
@@ -302,223 +362,82 @@ class LoadStreams:
                 # Phát hiện codec và tạo pipeline phù hợp
                 pipeline = self.create_pipeline_for_codec(rtsp_url)
                 
-                LOGGER.info(f"Using GStreamer pipeline for RTSP stream {index}: {source}")
+                LOGGER.info("Using GStreamer pipeline for RTSP stream %s: %s", index, source)
                 
                 # Tạo VideoCapture với GStreamer backend
                 cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
                 
                 # Kiểm tra xem GStreamer có hoạt động không
                 if not cap.isOpened():
-                    LOGGER.warning(f"GStreamer pipeline failed for stream {index}. Falling back to standard pipeline.")
+                    LOGGER.warning("GStreamer pipeline failed for stream %s. Falling back to standard pipeline.", index)
+                    self.invalidate_pipeline_cache(rtsp_url)
                     return False, None
                     
                 # Đọc thử một frame để xác nhận pipeline hoạt động
                 ret, _ = cap.read()
                 if not ret:
-                    LOGGER.warning(f"Could not read frame from stream {index}. Pipeline may be incorrect.")
+                    LOGGER.warning("Could not read frame from stream %s. Pipeline may be incorrect.", index)
                     cap.release()
+                    self.invalidate_pipeline_cache(rtsp_url)
                     return False, None
                     
                 return True, cap
             else:
                 # Nếu không phải RTSP, không sử dụng GStreamer
-                LOGGER.info(f"Stream {index} is not RTSP. Using standard pipeline.")
+                LOGGER.info("Stream %s is not RTSP. Using standard pipeline.", index)
                 return False, None
                     
         except Exception as e:
-            LOGGER.error(f"Error creating GStreamer pipeline for stream {index}: {str(e)}")
+            LOGGER.error("Error creating GStreamer pipeline for stream %s: %s", index, e)
             return False, None
                 
     def create_capture(self, source, index):
-        """Tạo và cấu hình VideoCapture với khả năng tự động phát hiện độ phân giải tối ưu"""
+        """Tạo và cấu hình VideoCapture (độ phân giải theo driver hoặc self.resolution cho webcam local)"""
         try:
-            LOGGER.info(f"Attempting to connect to stream: {source}")
+            LOGGER.info("Attempting to connect to stream: %s", source)
             
             # Thử sử dụng GStreamer nếu được kích hoạt và source là RTSP
             if self.has_gstreamer and isinstance(source, str) and source.startswith('rtsp://'):
                 success, cap = self.create_gstreamer_pipeline(source, index)
                 if success:
-                    LOGGER.info(f"Successfully connected to stream {index} using GStreamer")
+                    LOGGER.info("Successfully connected to stream %s using GStreamer", index)
                     return True, cap
                 else:
-                    LOGGER.warning(f"GStreamer connection failed for stream {index}. Falling back to standard method.")
+                    LOGGER.warning("GStreamer connection failed for stream %s. Falling back to standard method.", index)
 
             cap = cv2.VideoCapture(source)
             
             # Kiểm tra xem camera có được mở thành công không
             if not cap.isOpened():
-                LOGGER.error(f"Cannot open stream {index}: {source}")
+                LOGGER.error("Cannot open stream %s: %s", index, source)
                 return False, None
             
+            # Thiết lập MJPG để đạt FPS cao (đặt trước buffer size vì trên V4L2 buffer phụ thuộc định dạng)
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            
+            # Chỉ giữ 1 frame trong buffer cho mọi nguồn live để luôn đọc frame mới nhất (V4L2 mặc định 4 frame)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
             # Thiết lập thông số kỹ thuật timeout cho RTSP, HTTP streams
             if isinstance(source, str) and ('rtsp:' in source or 'http:' in source or 'https:' in source):
                 cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, self.timeout * 1000)
                 cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, self.timeout * 1000)
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            
-            # Thiết lập MJPG để đạt FPS cao
-            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
             
-            # Lưu lại độ phân giải mặc định trước khi thử nghiệm
-            default_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            default_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            LOGGER.info(f"Default resolution for stream {index}: {default_width}x{default_height}")
-            
-            # Đọc một frame để xác nhận độ phân giải mặc định
-            ret, frame = cap.read()
-            if ret:
-                default_frame_width = frame.shape[1]
-                default_frame_height = frame.shape[0]
-                LOGGER.info(f"Default frame size for stream {index}: {default_frame_width}x{default_frame_height}")
-            
-            # Danh sách các độ phân giải tiêu chuẩn để thử, từ cao đến thấp
-            standard_resolutions = [
-                (3840, 2160),  # 4K
-                (2560, 1440),  # 2K
-                (1920, 1080),  # Full HD
-                (1280, 720),   # HD
-                (640, 480)     # VGA
-            ]
-            
-            # Danh sách độ phân giải tùy chỉnh phổ biến
-            custom_resolutions = [
-                (1552, 1552),  # MacBook FaceTime HD
-                (1760, 1328),  # MacBook FaceTime HD khác
-            ]
-            
-            # Biến để lưu các độ phân giải hỗ trợ được tìm thấy
-            supported_resolutions = []
-            
-            # Thử từng độ phân giải tiêu chuẩn trước
-            for width, height in standard_resolutions:
+            # Chỉ đặt độ phân giải cho webcam local khi được yêu cầu; RTSP/HTTP do server quyết định
+            if isinstance(source, int) and self.resolution:
+                width, height = self.resolution
                 cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
                 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-                
-                # Đọc độ phân giải thực tế sau khi thiết lập
-                actual_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                actual_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                
-                # Đọc một frame để xác nhận
-                ret, test_frame = cap.read()
-                if not ret:
-                    continue
-                
-                frame_height, frame_width = test_frame.shape[:2]
-                
-                # Lưu lại độ phân giải thực tế và tính tỷ lệ khung hình
-                aspect_ratio = frame_width / frame_height
-                resolution_info = {
-                    'requested': (width, height),
-                    'actual': (frame_width, frame_height),
-                    'area': frame_width * frame_height,
-                    'aspect_ratio': aspect_ratio
-                }
-                
-                # Kiểm tra xem độ phân giải này đã được thêm vào chưa
-                is_duplicate = False
-                for res in supported_resolutions:
-                    if res['actual'] == (frame_width, frame_height):
-                        is_duplicate = True
-                        break
-                
-                if not is_duplicate:
-                    supported_resolutions.append(resolution_info)
-                    LOGGER.info(f"Found supported resolution: {frame_width}x{frame_height} (AR: {aspect_ratio:.2f}) for stream {index}")
+                cap.set(cv2.CAP_PROP_FPS, 30)
             
-            # Thử các độ phân giải tùy chỉnh
-            for width, height in custom_resolutions:
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-                
-                ret, test_frame = cap.read()
-                if not ret:
-                    continue
-                
-                frame_height, frame_width = test_frame.shape[:2]
-                aspect_ratio = frame_width / frame_height
-                
-                resolution_info = {
-                    'requested': (width, height),
-                    'actual': (frame_width, frame_height),
-                    'area': frame_width * frame_height,
-                    'aspect_ratio': aspect_ratio
-                }
-                
-                # Kiểm tra trùng lặp
-                is_duplicate = False
-                for res in supported_resolutions:
-                    if res['actual'] == (frame_width, frame_height):
-                        is_duplicate = True
-                        break
-                
-                if not is_duplicate:
-                    supported_resolutions.append(resolution_info)
-                    LOGGER.info(f"Found custom resolution: {frame_width}x{frame_height} (AR: {aspect_ratio:.2f}) for stream {index}")
-            
-            # Nếu không tìm thấy độ phân giải nào
-            if not supported_resolutions:
-                LOGGER.warning(f"No valid resolutions found for stream {index}. Using default.")
-                return True, cap
-            
-            # Phân loại các độ phân giải theo các nhóm tỷ lệ khung hình
-            aspect_ratio_groups = {
-                '16:9': [],  # ~1.78
-                '4:3': [],   # ~1.33
-                '1:1': [],   # ~1.0
-                'other': []
-            }
-            
-            for res in supported_resolutions:
-                ar = res['aspect_ratio']
-                if 1.7 <= ar <= 1.8:  # 16:9
-                    aspect_ratio_groups['16:9'].append(res)
-                elif 1.3 <= ar <= 1.4:  # 4:3
-                    aspect_ratio_groups['4:3'].append(res)
-                elif 0.95 <= ar <= 1.05:  # 1:1
-                    aspect_ratio_groups['1:1'].append(res)
-                else:
-                    aspect_ratio_groups['other'].append(res)
-            
-            # Sắp xếp mỗi nhóm theo diện tích (từ lớn đến nhỏ)
-            for group in aspect_ratio_groups.values():
-                group.sort(key=lambda x: x['area'], reverse=True)
-            
-            # Ưu tiên tìm độ phân giải tốt nhất theo thứ tự: 16:9, 4:3, 1:1, other
-            best_resolution = None
-            for ratio in ['16:9', '4:3', '1:1', 'other']:
-                if aspect_ratio_groups[ratio]:
-                    best_resolution = aspect_ratio_groups[ratio][0]
-                    LOGGER.info(f"Selected best resolution with {ratio} aspect ratio: {best_resolution['actual']}")
-                    break
-            
-            # Nếu vẫn không tìm được độ phân giải tốt nhất, sử dụng độ phân giải có diện tích lớn nhất
-            if best_resolution is None:
-                all_resolutions = sorted(supported_resolutions, key=lambda x: x['area'], reverse=True)
-                if all_resolutions:
-                    best_resolution = all_resolutions[0]
-                    LOGGER.info(f"Selected resolution with largest area: {best_resolution['actual']}")
-            
-            # Thiết lập camera với độ phân giải tốt nhất
-            if best_resolution:
-                requested_width, requested_height = best_resolution['requested']
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, requested_width)
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, requested_height)
-                
-                # Kiểm tra lại để đảm bảo
-                actual_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                actual_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                
-                # Thiết lập FPS mong muốn
-                target_fps = 30
-                cap.set(cv2.CAP_PROP_FPS, target_fps)
-                actual_fps = cap.get(cv2.CAP_PROP_FPS)
-                
-                LOGGER.info(f"Final resolution for stream {index}: {actual_width}x{actual_height}, FPS: {actual_fps}")
+            actual_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            actual_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            LOGGER.info("Resolution for stream %s: %sx%s", index, actual_width, actual_height)
             
             return True, cap
             
         except Exception as e:
-            LOGGER.error(f"Error creating capture for stream {index}: {source}. Error: {str(e)}")
+            LOGGER.error("Error creating capture for stream %s: %s. Error: %s", index, source, e)
             return False, None
     
     def reconnect_stream(self, index, source):
@@ -527,7 +446,7 @@ class LoadStreams:
             return False, None  # Đã có thread đang thử kết nối lại
             
         self.reconnecting[index] = True
-        LOGGER.warning(f"Attempting to reconnect to stream {index}: {source}")
+        LOGGER.warning("Attempting to reconnect to stream %s: %s", index, source)
         
         # Đóng kết nối cũ nếu còn tồn tại
         if self.caps[index] is not None:
@@ -538,34 +457,34 @@ class LoadStreams:
         
         # Thử kết nối lại với số lần thử xác định
         for attempt in range(self.reconnect_attempts):
-            LOGGER.info(f"Reconnection attempt {attempt+1}/{self.reconnect_attempts} for stream {index}")
+            LOGGER.info("Reconnection attempt %s/%s for stream %s", attempt + 1, self.reconnect_attempts, index)
             success, cap = self.create_capture(source, index)
             
             if success and cap.isOpened():
                 # Đọc frame đầu tiên để kiểm tra
                 ret, frame = cap.read()
                 if ret:
-                    LOGGER.info(f"Successfully reconnected to stream {index}")
+                    LOGGER.info("Successfully reconnected to stream %s", index)
                     self.reconnecting[index] = False
                     self.connection_status[index] = True
                     self.last_frame_time[index] = time.time()
                     return True, cap
             
-            # Chờ trước khi thử lại
-            time.sleep(self.reconnect_delay)
+            # Chờ trước khi thử lại (dừng ngay nếu loader bị đóng)
+            if self._quit.wait(self.reconnect_delay):
+                break
         
         # Nếu tất cả các lần thử đều thất bại
-        LOGGER.error(f"Failed to reconnect to stream {index} after {self.reconnect_attempts} attempts")
+        LOGGER.error("Failed to reconnect to stream %s after %s attempts", index, self.reconnect_attempts)
         self.reconnecting[index] = False
         return False, None
 
     def update(self, i, cap, stream):
         # Read stream `i` frames in daemon thread
-        n, _ = 0, self.frames[i]  # frame number, frame array
         max_failures_before_reconnect = 5
         consecutive_failures = 0
         
-        while True:  # Bỏ điều kiện dừng để luôn cố gắng duy trì kết nối
+        while not self._quit.is_set():  # Luôn cố gắng duy trì kết nối cho đến khi quit()/close()
             try:
                 if not self.connection_status[i]:
                     # Thử kết nối lại nếu mất kết nối
@@ -576,67 +495,84 @@ class LoadStreams:
                         consecutive_failures = 0
                     else:
                         # Nếu không thể kết nối lại, chờ và thử lại
-                        time.sleep(self.reconnect_delay)
+                        self._quit.wait(self.reconnect_delay)
                         continue
                 
                 # Kiểm tra xem kết nối có còn hoạt động không
                 if cap is None or not cap.isOpened():
-                    LOGGER.warning(f"Stream {i} connection lost. Attempting to reconnect...")
+                    LOGGER.warning("Stream %s connection lost. Attempting to reconnect...", i)
                     self.connection_status[i] = False
                     continue
                 
                 # Kiểm tra thời gian từ frame cuối cùng để phát hiện đóng băng
                 current_time = time.time()
                 if current_time - self.last_frame_time[i] > self.timeout and not self.reconnecting[i]:
-                    LOGGER.warning(f"Stream {i} appears frozen (no frames for {self.timeout}s). Attempting to reconnect...")
+                    LOGGER.warning("Stream %s appears frozen (no frames for %ss). Attempting to reconnect...", i, self.timeout)
                     self.connection_status[i] = False
                     continue
                 
-                # Đọc frame
-                n += 1
-                grab_success = cap.grab()  # .read() = .grab() followed by .retrieve()
+                # Chỉ xử lý mỗi vid_stride frame để giảm tải: grab() các frame bị bỏ qua, chỉ retrieve() frame cuối
+                grab_success = True
+                for _ in range(self.vid_stride):
+                    if not cap.grab():  # .read() = .grab() followed by .retrieve()
+                        grab_success = False
+                        break
                 
                 if not grab_success:
                     consecutive_failures += 1
-                    LOGGER.warning(f"Failed to grab frame from stream {i}. Failure count: {consecutive_failures}/{max_failures_before_reconnect}")
+                    self._warn_limited(i, "Failed to grab frame from stream %s. Failure count: %s/%s", i, consecutive_failures, max_failures_before_reconnect)
                     
                     if consecutive_failures >= max_failures_before_reconnect:
-                        LOGGER.warning(f"Stream {i} consistently failing. Attempting to reconnect...")
+                        LOGGER.warning("Stream %s consistently failing. Attempting to reconnect...", i)
                         self.connection_status[i] = False
                         consecutive_failures = 0
                         continue
                     
                     # Chờ một chút trước khi thử lại
-                    time.sleep(0.5)
+                    self._quit.wait(0.5)
                     continue
                 
                 # Reset bộ đếm lỗi nếu grab thành công
                 consecutive_failures = 0
                 
-                # Chỉ xử lý mỗi vid_stride frame để giảm tải
-                if n % self.vid_stride == 0:
-                    success, im = cap.retrieve()
-                    if success:
-                        self.imgs[i] = im
-                        self.last_frame_time[i] = time.time()  # Cập nhật thời gian frame cuối
-                    else:
-                        LOGGER.warning(f"WARNING ⚠️ Failed to retrieve frame from stream {i}")
-                        # Không đặt ngay lập tức connection_status = False,
-                        # cho phép một số lần thất bại trước khi thử kết nối lại
-                        consecutive_failures += 1
-                        if consecutive_failures >= max_failures_before_reconnect:
-                            LOGGER.warning(f"Stream {i} consistently failing on retrieve. Attempting to reconnect...")
-                            self.connection_status[i] = False
-                            consecutive_failures = 0
-                
-                # Thêm short sleep để tránh đóng băng CPU
-                time.sleep(0.001)
+                success, im = cap.retrieve(self._scratch[i])  # ghi trực tiếp vào buffer có sẵn
+                if success:
+                    self._publish(i, im)
+                    self.last_frame_time[i] = time.time()  # Cập nhật thời gian frame cuối
+                else:
+                    self._warn_limited(i, "WARNING ⚠️ Failed to retrieve frame from stream %s", i)
+                    # Không đặt ngay lập tức connection_status = False,
+                    # cho phép một số lần thất bại trước khi thử kết nối lại
+                    consecutive_failures += 1
+                    if consecutive_failures >= max_failures_before_reconnect:
+                        LOGGER.warning("Stream %s consistently failing on retrieve. Attempting to reconnect...", i)
+                        self.connection_status[i] = False
+                        consecutive_failures = 0
                 
             except Exception as e:
-                LOGGER.error(f"Error in stream {i} update: {str(e)}")
+                LOGGER.error("Error in stream %s update: %s", i, e)
                 self.connection_status[i] = False
                 # Chờ trước khi thử lại để tránh vòng lặp lỗi quá nhanh
-                time.sleep(1)
+                self._quit.wait(1)
+
+    def _warn_limited(self, i, msg, *args):
+        # Log tối đa 1 warning/giây cho mỗi stream, gộp số warning bị bỏ qua vào message tiếp theo
+        now = time.monotonic()
+        if now - self._last_warn[i] < 1.0:
+            self._warn_skipped[i] += 1
+            return
+        skipped, self._warn_skipped[i] = self._warn_skipped[i], 0
+        self._last_warn[i] = now
+        if skipped:
+            LOGGER.warning(msg + " (+%d similar in the last interval)", *args, skipped)
+        else:
+            LOGGER.warning(msg, *args)
+
+    def _publish(self, i, im):
+        # Đưa frame vừa đọc vào slot pending, trả slot pending cũ về cho thread đọc dùng lại
+        with self._locks[i]:
+            self._scratch[i], self._pending[i] = self._pending[i], im
+            self._fresh[i] = True
 
     def __iter__(self):
         self.count = -1
@@ -644,36 +580,55 @@ class LoadStreams:
 
     def __next__(self):
         self.count += 1
-        if not any(x.is_alive() for x in self.threads) or cv2.waitKey(1) == ord('q'):  # q to quit
-            cv2.destroyAllWindows()
+        if self._quit.is_set() or not any(x.is_alive() for x in self.threads):
             raise StopIteration
 
-        # Hiển thị trạng thái kết nối cho user
-        for i, status in enumerate(self.connection_status):
-            if not status and not self.reconnecting[i]:
-                LOGGER.info(f"Stream {i} disconnected. Reconnection in progress...")
+        # Hiển thị trạng thái kết nối cho user, chỉ khi trạng thái thay đổi
+        if self.connection_status != self._prev_status:
+            for i, status in enumerate(self.connection_status):
+                if status != self._prev_status[i]:
+                    self._prev_status[i] = status
+                    if status:
+                        LOGGER.info("Stream %s reconnected.", i)
+                    else:
+                        LOGGER.info("Stream %s disconnected. Reconnection in progress...", i)
         
-        # Tạo bản sao của hình ảnh hiện tại
-        im0 = self.imgs.copy()
+        # Lấy frame mới nhất của mỗi stream bằng cách đổi buffer, không copy dữ liệu ảnh.
+        # Frame trả về chỉ hợp lệ đến lần gọi __next__ kế tiếp (buffer cũ sẽ được ghi đè)
+        new_frame = [False] * len(self._locks)
+        for i, lock in enumerate(self._locks):
+            with lock:
+                if self._fresh[i]:
+                    self.imgs[i], self._pending[i] = self._pending[i], self.imgs[i]
+                    self._fresh[i] = False
+                    new_frame[i] = True
+        im0 = self.imgs.copy()  # list mới, các mảng ảnh không bị copy
         
         # Thêm thông tin trạng thái kết nối
         connection_info = {i: {'status': self.connection_status[i], 
                               'reconnecting': self.reconnecting[i], 
-                              'last_frame': self.last_frame_time[i]} 
+                              'last_frame': self.last_frame_time[i],
+                              'new_frame': new_frame[i]}  # False = same frame as the previous call
                           for i in range(len(self.sources))}
 
         return self.sources, im0, None, connection_info
 
+    def quit(self):
+        # Stop iteration on the next __next__ call (e.g. from a display loop when 'q' is pressed) and the reader threads
+        self._quit.set()
+
     def __len__(self):
         return len(self.sources)  # 1E12 frames = 32 streams at 30 FPS for 30 years
     
     def close(self):
         """Đóng tất cả các kết nối và giải phóng tài nguyên"""
+        self._quit.set()  # báo cho các thread đọc dừng vòng lặp và thoát khỏi các lần chờ
         for i, cap in enumerate(self.caps):
             if cap is not None:
                 cap.release()
         
-        # Chờ tất cả các thread kết thúc
+        # Chờ tất cả các thread kết thúc, tổng thời gian chờ tối đa 1 giây cho mọi stream
+        deadline = time.monotonic() + 1.0
         for thread in self.threads:
             if thread.is_alive():
-                thread.join(timeout=1.0)
+                thread.join(timeout=max(0.0, deadline - time.monotonic()))
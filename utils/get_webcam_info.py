@@ -1,59 +1,66 @@
 import cv2
 import time
+import numpy as np
+import struct
+from concurrent.futures import ThreadPoolExecutor
 
-def get_webcam_properties(cap):
-    # Danh sách các thuộc tính của webcam để kiểm tra
-    prop_list = {
-        'CAP_PROP_POS_MSEC': cv2.CAP_PROP_POS_MSEC,
-        'CAP_PROP_POS_FRAMES': cv2.CAP_PROP_POS_FRAMES,
-        'CAP_PROP_POS_AVI_RATIO': cv2.CAP_PROP_POS_AVI_RATIO,
-        'CAP_PROP_FRAME_WIDTH': cv2.CAP_PROP_FRAME_WIDTH,
-        'CAP_PROP_FRAME_HEIGHT': cv2.CAP_PROP_FRAME_HEIGHT,
-        'CAP_PROP_FPS': cv2.CAP_PROP_FPS,
-        'CAP_PROP_FOURCC': cv2.CAP_PROP_FOURCC,
-        'CAP_PROP_FRAME_COUNT': cv2.CAP_PROP_FRAME_COUNT,
-        'CAP_PROP_FORMAT': cv2.CAP_PROP_FORMAT,
-        'CAP_PROP_MODE': cv2.CAP_PROP_MODE,
-        'CAP_PROP_BRIGHTNESS': cv2.CAP_PROP_BRIGHTNESS,
-        'CAP_PROP_CONTRAST': cv2.CAP_PROP_CONTRAST,
-        'CAP_PROP_SATURATION': cv2.CAP_PROP_SATURATION,
-        'CAP_PROP_HUE': cv2.CAP_PROP_HUE,
-        'CAP_PROP_GAIN': cv2.CAP_PROP_GAIN,
-        'CAP_PROP_EXPOSURE': cv2.CAP_PROP_EXPOSURE,
-        'CAP_PROP_CONVERT_RGB': cv2.CAP_PROP_CONVERT_RGB,
-        'CAP_PROP_WHITE_BALANCE_BLUE_U': cv2.CAP_PROP_WHITE_BALANCE_BLUE_U,
-        'CAP_PROP_WHITE_BALANCE_RED_V': cv2.CAP_PROP_WHITE_BALANCE_RED_V,
-        'CAP_PROP_ISO_SPEED': cv2.CAP_PROP_ISO_SPEED,
-        'CAP_PROP_BUFFERSIZE': cv2.CAP_PROP_BUFFERSIZE,
-        'CAP_PROP_AUTOFOCUS': cv2.CAP_PROP_AUTOFOCUS,
-        'CAP_PROP_ZOOM': cv2.CAP_PROP_ZOOM
-    }
+# Danh sách các thuộc tính của webcam để kiểm tra
+_PROP_LIST = tuple((name, getattr(cv2, name)) for name in (
+    'CAP_PROP_POS_MSEC',
+    'CAP_PROP_POS_FRAMES',
+    'CAP_PROP_POS_AVI_RATIO',
+    'CAP_PROP_FRAME_WIDTH',
+    'CAP_PROP_FRAME_HEIGHT',
+    'CAP_PROP_FPS',
+    'CAP_PROP_FOURCC',
+    'CAP_PROP_FRAME_COUNT',
+    'CAP_PROP_FORMAT',
+    'CAP_PROP_MODE',
+    'CAP_PROP_BRIGHTNESS',
+    'CAP_PROP_CONTRAST',
+    'CAP_PROP_SATURATION',
+    'CAP_PROP_HUE',
+    'CAP_PROP_GAIN',
+    'CAP_PROP_EXPOSURE',
+    'CAP_PROP_CONVERT_RGB',
+    'CAP_PROP_WHITE_BALANCE_BLUE_U',
+    'CAP_PROP_WHITE_BALANCE_RED_V',
+    'CAP_PROP_ISO_SPEED',
+    'CAP_PROP_BUFFERSIZE',
+    'CAP_PROP_AUTOFOCUS',
+    'CAP_PROP_ZOOM',
+))
 
+def get_webcam_properties(cap):
     # Thu thập tất cả thông tin có thể từ camera
-    properties = {}
-    for prop_name, prop_id in prop_list.items():
-        value = cap.get(prop_id)
-        properties[prop_name] = value
+    properties = {name: cap.get(prop_id) for name, prop_id in _PROP_LIST}
 
-    # Xử lý đặc biệt với FOURCC để hiển thị định dạng
-    fourcc = properties.get('CAP_PROP_FOURCC', 0)
-    fourcc_str = ''.join([chr((int(fourcc) >> (i * 8)) & 0xFF) for i in range(4)])
-    properties['CAP_PROP_FOURCC_STR'] = fourcc_str
+    # Xử lý đặc biệt với FOURCC để hiển thị định dạng (4 byte little-endian)
+    fourcc = int(properties['CAP_PROP_FOURCC']) & 0xFFFFFFFF
+    properties['CAP_PROP_FOURCC_STR'] = struct.pack('<I', fourcc).decode('latin-1')
 
     return properties
 
 def measure_actual_fps(cap, num_frames=100):
-    # Đo FPS thực tế
+    # Đo FPS thực tế: chỉ grab() (không decode) vì chỉ cần đếm frame đến
+    frames = 0
     start = time.time()
     for i in range(num_frames):
-        ret, frame = cap.read()
-        if not ret:
+        if not cap.grab():
             break
+        frames += 1
     end = time.time()
     elapsed = end - start
-    actual_fps = num_frames / elapsed if elapsed > 0 else 0
+    actual_fps = frames / elapsed if elapsed > 0 else 0
     return actual_fps
 
+def _probe_camera(camera_id):
+    # Trả về camera_id nếu mở được camera, ngược lại None
+    cap = cv2.VideoCapture(camera_id)
+    opened = cap.isOpened()
+    cap.release()
+    return camera_id if opened else None
+
 def test_supported_resolutions(device_id=0):
     # Danh sách các độ phân giải phổ biến để thử nghiệm
     resolutions = [
@@ -71,13 +78,15 @@ def test_supported_resolutions(device_id=0):
 
     supported_resolutions = []
     
+    # Mở camera một lần và thử lần lượt các độ phân giải trên cùng một kết nối
+    cap = cv2.VideoCapture(device_id)
+    if not cap.isOpened():
+        print(f"Không thể mở camera với ID {device_id}")
+        cap.release()
+        return supported_resolutions
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Chỉ giữ 1 frame trong buffer (không phải backend nào cũng hỗ trợ)
+    
     for width, height in resolutions:
-        cap = cv2.VideoCapture(device_id)
-        if not cap.isOpened():
-            print(f"Không thể mở camera với ID {device_id}")
-            cap.release()
-            break
-            
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         
@@ -96,8 +105,8 @@ def test_supported_resolutions(device_id=0):
             print(f"Thử nghiệm độ phân giải {width}x{height}:")
             print(f"  - Độ phân giải đã cài đặt: {actual_width}x{actual_height}")
             print(f"  - Kích thước khung hình thực tế: {actual_frame_width}x{actual_frame_height}")
-        
-        cap.release()
+    
+    cap.release()
     
     return supported_resolutions
 
@@ -106,12 +115,9 @@ def main():
     
     # Danh sách các camera có thể kết nối
     print("\n===== KIỂM TRA CÁC CAMERA CÓ THỂ KẾT NỐI =====")
-    available_cameras = []
-    for i in range(5):  # Thử với 5 ID camera đầu tiên
-        cap = cv2.VideoCapture(i)
-        if cap.isOpened():
-            available_cameras.append(i)
-            cap.release()
+    # Thử với 5 ID camera đầu tiên, mở song song để tổng thời gian bằng camera chậm nhất
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        available_cameras = [i for i in executor.map(_probe_camera, range(5)) if i is not None]
     
     print(f"Cameras có sẵn: {available_cameras}")
     
@@ -128,6 +134,7 @@ def main():
         print("\n===== THÔNG TIN CHI TIẾT CAMERA =====")
         cap = cv2.VideoCapture(camera_id)
         if cap.isOpened():
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Hiển thị frame mới nhất thay vì frame cũ trong buffer
             properties = get_webcam_properties(cap)
             
             # In thông tin chung
@@ -151,14 +158,20 @@ def main():
             print("\n===== HIỂN THỊ VIDEO TỪ CAMERA =====")
             print("Nhấn 'q' để thoát khỏi video")
             
+            overlay, overlay_mask, overlay_shape = None, None, None
             while True:
                 ret, frame = cap.read()
                 if not ret:
                     break
                 
-                # Hiển thị thông tin trên khung hình
-                frame_info = f"Resolution: {frame.shape[1]}x{frame.shape[0]}, FPS: {actual_fps:.2f}"
-                cv2.putText(frame, frame_info, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                # Hiển thị thông tin trên khung hình: text không đổi nên chỉ vẽ lại khi kích thước frame thay đổi
+                if frame.shape != overlay_shape:
+                    overlay_shape = frame.shape
+                    overlay = np.zeros((min(40, frame.shape[0]), frame.shape[1], 3), dtype=np.uint8)
+                    frame_info = f"Resolution: {frame.shape[1]}x{frame.shape[0]}, FPS: {actual_fps:.2f}"
+                    cv2.putText(overlay, frame_info, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                    overlay_mask = overlay.any(axis=2, keepdims=True)
+                np.copyto(frame[:overlay.shape[0]], overlay, where=overlay_mask)
                 
                 cv2.imshow('Webcam', frame)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -1,3 +1,5 @@
+import sys
+import codecs
 import platform
 import logging
 import logging.config
@@ -9,9 +11,29 @@ except ImportError:
     COLORLOG_AVAILABLE = False
 
 LOGGING_NAME = "InsightFace"
+_CONFIGURED = set()  # logger names already set up by set_logging
+
+class EncodingSafeFilter(logging.Filter):
+    # Drop characters (e.g. emojis) the console encoding can't represent, instead of raising on emit
+    def __init__(self, encoding):
+        super().__init__()
+        self.encoding = encoding
+
+    def filter(self, record):
+        record.msg = record.getMessage().encode(self.encoding, "ignore").decode(self.encoding)
+        record.args = ()
+        return True
 
 def set_logging(name=LOGGING_NAME, verbose=True, debug=False):
     level = logging.DEBUG if debug else (logging.INFO if verbose else logging.WARNING)
+
+    # Already configured: only update levels instead of re-running dictConfig
+    if name in _CONFIGURED:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        for handler in logger.handlers:
+            handler.setLevel(level)
+        return
     # - %(name)s
     formatter_str = "%(asctime)s | %(levelname)s | %(module)s:%(lineno)d | %(message)s"
     datefmt = "%Y-%m-%d %H:%M:%S"
@@ -61,11 +83,14 @@ def set_logging(name=LOGGING_NAME, verbose=True, debug=False):
         }
     })
 
-    # Emoji safe logging cho Windows (nếu cần)
+    # Emoji safe logging cho Windows (nếu console không dùng UTF-8)
     logger = logging.getLogger(name)
-    if platform.system() == 'Windows':
-        for fn in logger.info, logger.warning:
-            setattr(logger, fn.__name__, lambda x: fn(str(x)))
+    encoding = getattr(sys.stderr, "encoding", None) or "utf-8"
+    if platform.system() == 'Windows' and codecs.lookup(encoding).name != "utf-8":
+        for handler in logger.handlers:
+            handler.addFilter(EncodingSafeFilter(encoding))
+
+    _CONFIGURED.add(name)
 
 # Gọi khởi tạo logger
 set_logging(debug=True)
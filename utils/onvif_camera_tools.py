@@ -1,9 +1,23 @@
 import re
+import time
+import select
 import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from onvif import ONVIFCamera
 import socket
 from utils.logger_config import LOGGER
 
+# Supported MAC formats: xx:xx:xx:xx:xx:xx, xx-xx-xx-xx-xx-xx, xxxxxxxxxxxx
+_MAC_RE = re.compile(r'^(?:[0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}$|^[0-9A-Fa-f]{12}$')
+_MAC_SEP_RE = re.compile(r'[:-]')
+
+# ONVIFCamera objects parse their WSDL files on construction; reuse them for a short while
+_CAMERA_CACHE = {}  # (ip, port, username, password) -> (created_at, ONVIFCamera)
+_CAMERA_CACHE_TTL = 30.0  # seconds
+_CAMERA_CACHE_LOCK = threading.Lock()
+
 class CameraConnectionError(Exception):
     """Exception raised when camera connection fails"""
     pass
@@ -79,21 +93,12 @@ def _validate_ip_address(ip):
 
 def _validate_mac_address(mac):
     """Validate MAC address format"""
-    # Support formats: xx:xx:xx:xx:xx:xx, xx-xx-xx-xx-xx-xx, xxxxxxxxxxxx
-    mac_patterns = [
-        r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$',  # xx:xx:xx:xx:xx:xx or xx-xx-xx-xx-xx-xx
-        r'^[0-9A-Fa-f]{12}$'  # xxxxxxxxxxxx
-    ]
-    
-    for pattern in mac_patterns:
-        if re.match(pattern, mac):
-            return True
-    return False
+    return _MAC_RE.match(mac) is not None
 
 def _normalize_mac_address(mac):
     """Normalize MAC address to lowercase with colons"""
     # Remove separators and convert to lowercase
-    clean_mac = re.sub(r'[:-]', '', mac.lower())
+    clean_mac = _MAC_SEP_RE.sub('', mac.lower())
     # Add colons every 2 characters
     return ':'.join(clean_mac[i:i+2] for i in range(0, 12, 2))
 
@@ -107,28 +112,61 @@ def _find_ip_by_mac(mac_address, username, password):
         
         normalized_target_mac = _normalize_mac_address(mac_address)
         
-        for ip in onvif_ips:
-            try:
-                network_configs = get_network_configuration(ip, username, password)
+        # Query all cameras in parallel (network-bound) and stop at the first match
+        executor = ThreadPoolExecutor(max_workers=min(16, len(onvif_ips)))
+        try:
+            futures = {executor.submit(get_network_configuration, ip, username, password): ip for ip in onvif_ips}
+            for future in as_completed(futures):
+                ip = futures[future]
+                try:
+                    network_configs = future.result()
+                except Exception as e:
+                    LOGGER.warning(f"Không thể kết nối đến {ip}: {e}")
+                    continue
+                
                 for config in network_configs:
                     device_mac = _normalize_mac_address(config["MAC Address"])
                     if device_mac == normalized_target_mac:
                         LOGGER.info(f"Tìm thấy camera với MAC {mac_address} tại IP {ip}")
                         return ip
-            except Exception as e:
-                LOGGER.warning(f"Không thể kết nối đến {ip}: {e}")
-                continue
+        finally:
+            # Don't wait for the remaining cameras once a match is found
+            executor.shutdown(wait=False, cancel_futures=True)
         
         return None
         
     except Exception as e:
         raise CameraConnectionError(f"Lỗi khi tìm kiếm camera: {e}")
 
+def _get_camera(ip, port, username, password):
+    """Get a cached ONVIFCamera, creating it if missing or older than _CAMERA_CACHE_TTL"""
+    key = (ip, port, username, password)
+    now = time.monotonic()
+    with _CAMERA_CACHE_LOCK:
+        entry = _CAMERA_CACHE.get(key)
+        if entry and now - entry[0] < _CAMERA_CACHE_TTL:
+            return entry[1]
+        
+        # Evict stale entries while we hold the lock
+        for stale_key in [k for k, (created_at, _) in _CAMERA_CACHE.items() if now - created_at >= _CAMERA_CACHE_TTL]:
+            del _CAMERA_CACHE[stale_key]
+    
+    # Construct outside the lock so parallel lookups for different cameras don't serialize
+    camera = ONVIFCamera(ip, port, username, password)
+    with _CAMERA_CACHE_LOCK:
+        _CAMERA_CACHE[key] = (now, camera)
+    return camera
+
+def _drop_camera(ip, port, username, password):
+    """Remove a camera from the cache (e.g. after a failed request)"""
+    with _CAMERA_CACHE_LOCK:
+        _CAMERA_CACHE.pop((ip, port, username, password), None)
+
 def _get_rtsp_url_from_camera(ip, username, password, port):
     """Get RTSP URL from camera"""
     try:
         # Connect to camera
-        camera = ONVIFCamera(ip, port, username, password)
+        camera = _get_camera(ip, port, username, password)
         media_service = camera.create_media_service()
         
         # Get video profiles
@@ -179,11 +217,17 @@ def _get_rtsp_url_from_camera(ip, username, password, port):
             raise CameraConnectionError("Không thể lấy RTSP URL từ bất kỳ profile nào")
             
     except Exception as e:
+        _drop_camera(ip, port, username, password)
         raise CameraConnectionError(f"Lỗi khi kết nối camera tại {ip}:{port} - {e}")
 
 # Existing functions from your code (unchanged)
-def discover_onvif_devices():
-    """Discover ONVIF devices on network"""
+def discover_onvif_devices(timeout=5.0, quiet_period=0.6, probe_count=3):
+    """
+    Discover ONVIF devices on network
+    
+    Returns as soon as no new replies arrive for quiet_period seconds after the last probe
+    (WS-Discovery devices answer within 500ms), or after timeout seconds at most.
+    """
     onvif_port = 3702
     message = """
         <e:Envelope xmlns:e="http://www.w3.org/2003/05/soap-envelope"
@@ -205,19 +249,49 @@ def discover_onvif_devices():
     
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-    sock.settimeout(5)
-    sock.sendto(message, ('239.255.255.250', onvif_port))
+    sock.setblocking(False)
     
     discovered_ips = set()
+    start = time.monotonic()
+    deadline = start + timeout
+    last_activity = start  # last probe sent or reply received
+    next_probe = start
+    probes_sent = 0
     try:
         while True:
-            data, addr = sock.recvfrom(4096)
-            discovered_ips.add(addr[0])
-    except socket.timeout:
-        pass
+            now = time.monotonic()
+            
+            # UDP is lossy: repeat the probe (same MessageID, so devices answer once) every 100ms
+            if probes_sent < probe_count and now >= next_probe:
+                sock.sendto(message, ('239.255.255.250', onvif_port))
+                probes_sent += 1
+                next_probe = now + 0.1
+                last_activity = now
+            
+            if now >= deadline or (probes_sent == probe_count and now - last_activity >= quiet_period):
+                break
+            
+            wake_at = min(deadline, last_activity + quiet_period)
+            if probes_sent < probe_count:
+                wake_at = min(wake_at, next_probe)
+            readable, _, _ = select.select([sock], [], [], max(0.0, wake_at - now))
+            if not readable:
+                continue
+            
+            # Drain every reply that is already queued
+            while True:
+                try:
+                    data, addr = sock.recvfrom(4096)
+                except BlockingIOError:
+                    break
+                discovered_ips.add(addr[0])
+            last_activity = time.monotonic()
+    finally:
+        sock.close()
     
     return list(discovered_ips)
 
+@lru_cache(maxsize=33)  # prefix lengths 0-32
 def prefix_to_netmask(prefix_length):
     """Convert prefix length to subnet mask"""
     return str(ipaddress.IPv4Network((0, prefix_length)).netmask)
@@ -226,7 +300,7 @@ def get_network_configuration(ip, username, password, port=80):
     """Get network configuration from camera"""
     network_info = []
     try:
-        camera = ONVIFCamera(ip, port, username, password)
+        camera = _get_camera(ip, port, username, password)
         network_service = camera.create_devicemgmt_service()
         network_interfaces = network_service.GetNetworkInterfaces()
         
@@ -246,6 +320,7 @@ def get_network_configuration(ip, username, password, port=80):
             
     except Exception as e:
         LOGGER.error(f"Failed to get network configuration for {ip}: {e}")
+        _drop_camera(ip, port, username, password)
         raise
         
     return network_info
\ No newline at end of file
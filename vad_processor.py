@@ -1,3 +1,4 @@
+from math import sqrt as _sqrt
 import numpy as np
 from typing import Tuple
 from config import Config
@@ -6,13 +7,24 @@ from utils.logger_config import LOGGER
 class VADProcessor:
     """Voice Activity Detection using simple RMS-based approach"""
     
+    NOISE_WINDOW = 50   # Non-speech frames averaged for the background noise level
+    NOISE_BUDGET = 100  # Total non-speech frames used for adaptation
+    
     def __init__(self):
         self.silence_threshold = Config.SILENCE_THRESHOLD
         self.min_speech_frames = Config.MIN_SPEECH_FRAMES
         
+        # Config values read on every frame, looked up once
+        self._verbose = Config.VERBOSE
+        self._min_threshold = Config.SILENCE_THRESHOLD
+        self._noise_floor = Config.SILENCE_THRESHOLD / 3.0  # Background level below which the threshold stays at the minimum
+        
         # Adaptive threshold (will adjust based on background noise)
         self.background_noise_level = 0
-        self.noise_samples = []
+        self.noise_samples = [0.0] * self.NOISE_WINDOW  # Ring buffer of recent non-speech RMS values
+        self.noise_count = 0  # Non-speech frames collected so far
+        self._noise_sum = 0.0  # Running sum of the ring buffer
+        self._adaptation_done = False  # Set once NOISE_BUDGET frames have been collected
         self.adaptation_frames = 0
         
         if Config.VERBOSE:
@@ -22,31 +34,50 @@ class VADProcessor:
         """Calculate RMS (Root Mean Square) for volume detection"""
         try:
             audio_array = np.frombuffer(audio_chunk, dtype=np.int16)
-            if len(audio_array) == 0:
+            n = audio_array.size
+            if n == 0:
                 return 0.0
             
-            # Calculate RMS
-            rms = np.sqrt(np.mean(audio_array.astype(np.float32) ** 2))
-            return rms
+            # Sum of squares accumulated in int64 (no int16 overflow); einsum casts in small
+            # internal blocks, so no widened copy of the chunk is allocated
+            sum_squares = np.einsum('i,i->', audio_array, audio_array, dtype=np.int64)
+            return _sqrt(int(sum_squares) / n)
         except Exception as e:
             if Config.VERBOSE:
                 LOGGER.error(f"Error calculating RMS: {e}")
             return 0.0
     
+    def calculate_rms_batch(self, frames: np.ndarray) -> np.ndarray:
+        """Calculate RMS for each row of an (N, frame_size) int16 array"""
+        if frames.size == 0:
+            return np.zeros(frames.shape[0], dtype=np.float64)
+        
+        # Per-frame sums of squares in one int64 reduction over the whole batch
+        sum_squares = np.einsum('nf,nf->n', frames, frames, dtype=np.int64)
+        return np.sqrt(sum_squares / frames.shape[1])
+    
     def adapt_threshold(self, rms_value: float, is_speech: bool):
         """Adaptively adjust threshold based on background noise"""
-        if not is_speech and len(self.noise_samples) < 100:
-            self.noise_samples.append(rms_value)
+        if not is_speech and self.noise_count < self.NOISE_BUDGET:
+            # O(1) update: overwrite the oldest sample and adjust the running sum
+            slot = self.noise_count % self.NOISE_WINDOW
+            self._noise_sum += rms_value - self.noise_samples[slot]
+            self.noise_samples[slot] = rms_value
+            self.noise_count += 1
+            if self.noise_count >= self.NOISE_BUDGET:
+                self._adaptation_done = True
             
-            if len(self.noise_samples) >= 50:
-                # Update background noise level
-                self.background_noise_level = np.mean(self.noise_samples[-50:])
-                # Set threshold to be 3x background noise
-                adaptive_threshold = max(self.background_noise_level * 3, Config.SILENCE_THRESHOLD)
+            if self.noise_count >= self.NOISE_WINDOW:
+                # Update background noise level (mean of the last NOISE_WINDOW samples)
+                background = self._noise_sum / self.NOISE_WINDOW
+                self.background_noise_level = background
+                # Set threshold to be 3x background noise, but never below the configured minimum
+                adaptive_threshold = background * 3.0 if background > self._noise_floor else self._min_threshold
                 
-                if abs(adaptive_threshold - self.silence_threshold) > 100:
+                delta = adaptive_threshold - self.silence_threshold
+                if delta > 100 or delta < -100:
                     self.silence_threshold = adaptive_threshold
-                    if Config.VERBOSE:
+                    if self._verbose:
                         LOGGER.info(f"Adapted VAD threshold to: {self.silence_threshold:.1f}")
     
     def is_speech(self, audio_chunk: bytes) -> Tuple[bool, float]:
@@ -59,19 +90,44 @@ class VADProcessor:
         # Simple threshold-based detection
         is_speech_detected = rms_value > self.silence_threshold
         
-        # Adaptive threshold adjustment
-        self.adapt_threshold(rms_value, is_speech_detected)
+        # Adaptive threshold adjustment (skipped entirely once the noise budget is used up)
+        if not self._adaptation_done:
+            self.adapt_threshold(rms_value, is_speech_detected)
         
-        if Config.VERBOSE and self.adaptation_frames % 100 == 0:
+        if self._verbose and self.adaptation_frames % 100 == 0:
             LOGGER.debug(f"VAD - RMS: {rms_value:.1f}, Threshold: {self.silence_threshold:.1f}, Speech: {is_speech_detected}")
         
         self.adaptation_frames += 1
         
         return is_speech_detected, rms_value
     
+    def is_speech_batch(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Detect speech for each row of an (N, frame_size) int16 array
+        Returns: (is_speech[N], rms_values[N])
+        """
+        rms_values = self.calculate_rms_batch(frames)
+        self.adaptation_frames += len(rms_values)
+        
+        # Threshold is fixed once adaptation is done, so the whole batch can be compared at once
+        if self._adaptation_done:
+            return rms_values > self.silence_threshold, rms_values
+        
+        # Otherwise decide frame by frame, since each non-speech frame may move the threshold
+        decisions = np.empty(len(rms_values), dtype=bool)
+        for k, rms_value in enumerate(rms_values.tolist()):
+            decisions[k] = is_speech_detected = rms_value > self.silence_threshold
+            if not self._adaptation_done:
+                self.adapt_threshold(rms_value, is_speech_detected)
+        
+        return decisions, rms_values
+    
     def reset(self):
         """Reset VAD state"""
-        self.noise_samples.clear()
+        self.noise_samples = [0.0] * self.NOISE_WINDOW
+        self.noise_count = 0
+        self._noise_sum = 0.0
+        self._adaptation_done = False
         self.adaptation_frames = 0
         self.background_noise_level = 0
         if Config.VERBOSE:
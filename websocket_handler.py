@@ -1,17 +1,38 @@
 import asyncio
 import json
 import time
-from typing import Optional, List
-from collections import deque
-from datetime import datetime
+import numpy as np
+from typing import Optional
 from fastapi import WebSocket, WebSocketDisconnect
 
 from config import Config
 from models import TranscriptionResponse, ConnectionStatus
 from stt_service import STTService
 from vad_processor import VADProcessor
+from utils import now_iso
 from utils.logger_config import LOGGER
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Control message decoder (orjson.JSONDecodeError and json.JSONDecodeError both subclass ValueError)
+_json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+def _static_message(type: str, text: Optional[str] = None) -> str:
+    """Serialize a message whose only variable field is the timestamp into a %-template"""
+    return TranscriptionResponse(type=type, timestamp="__ts__", text=text).to_json().replace("__ts__", "%s")
+
+# Pre-serialized status/speech events (fill with: template % now_iso())
+_MSG_CONNECTED = _static_message("status", "Connected to STT service")
+_MSG_REPLACED = _static_message("status", "Connection replaced by new client")
+_MSG_READY = _static_message("status", "Ready to receive audio")
+_MSG_STOPPED = _static_message("status", "Audio recording stopped")
+_MSG_SPEECH_START = _static_message("speech_start")
+_MSG_SPEECH_END = _static_message("speech_end")
+
 class WebSocketHandler:
     """Handle WebSocket connections and audio processing"""
     
@@ -20,15 +41,36 @@ class WebSocketHandler:
         self.current_connection: Optional[WebSocket] = None
         self.connection_status: Optional[ConnectionStatus] = None
         
+        # Verbose logging for the audio path, bound once: a no-op when VERBOSE is off (messages use lazy %-args)
+        self._logv = LOGGER.info if Config.VERBOSE else (lambda *args, **kwargs: None)
+        
+        # Outgoing messages are queued and sent by a writer task, so audio processing never waits on the socket
+        self._out_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+        self._partial_slot: Optional[list] = None  # [message] of the queued partial still open to overwrites
+        self._binary_json = False  # Client asked for JSON in binary frames ("binary_json" on start)
+        
         # Audio processing state
-        self.audio_buffer = deque(maxlen=Config.MAX_AUDIO_BUFFER)
+        self._frames_buffered = 0  # Frames received since the last reset (buffer_size in get_status)
+        self._frames_processed = 0  # Frames received on the current connection
         self.vad_processor = VADProcessor()
+        self._frame_bytes = Config.CHUNK_SIZE * 2  # 2 bytes per sample
+        self._vad_batch_bytes = Config.VAD_BATCH_FRAMES * self._frame_bytes
+        self._vad_accum = bytearray(self._vad_batch_bytes)  # Reused buffer for frames waiting for the next batched VAD call
+        self._vad_accum_len = 0
         
         # Speech state
         self.is_speaking = False
-        self.speech_frames: List[bytes] = []
+        self._max_speech_bytes = Config.MAX_SPEECH_FRAMES * self._frame_bytes
+        self._speech_buf = bytearray(self._max_speech_bytes)  # Preallocated PCM of the current utterance
+        self._speech_len = 0  # Bytes of _speech_buf in use
+        self.speech_frame_count = 0
         self.silence_count = 0
         self.last_partial_time = 0.0
+        self._utterance_id = 0  # Bumped on every speech start; partials of older utterances are dropped
+        self._partial_task: Optional[asyncio.Task] = None
+        self._partial_window_bytes = Config.PARTIAL_WINDOW_FRAMES * Config.CHUNK_SIZE * 2  # 2 bytes per sample
         
         if Config.VERBOSE:
             LOGGER.info("WebSocket handler initialized")
@@ -38,11 +80,9 @@ class WebSocketHandler:
         # Disconnect existing connection if any
         if self.current_connection:
             try:
-                await self._send_message(TranscriptionResponse(
-                    type="status",
-                    text="Connection replaced by new client",
-                    timestamp=datetime.now().isoformat()
-                ))
+                # Stop the old writer first so the notice is the last thing sent before close
+                self._stop_writer()
+                await self.current_connection.send_text(_MSG_REPLACED % now_iso())
                 await self.current_connection.close()
                 if Config.VERBOSE:
                     LOGGER.info("Closed existing connection")
@@ -53,9 +93,14 @@ class WebSocketHandler:
         # Accept new connection
         await websocket.accept()
         self.current_connection = websocket
+        self._binary_json = False
+        self._out_queue = asyncio.Queue(maxsize=Config.SEND_QUEUE_SIZE)
+        self._partial_slot = None
+        self._writer_task = asyncio.create_task(self._writer_loop(websocket, self._out_queue))
+        self._frames_processed = 0
         self.connection_status = ConnectionStatus(
             client_id=client_id,
-            connected_at=datetime.now()
+            connected_at=now_iso()
         )
         
         # Reset state
@@ -66,17 +111,14 @@ class WebSocketHandler:
             LOGGER.info(f"New client connected: {client_id}")
         
         # Send welcome message
-        await self._send_message(TranscriptionResponse(
-            type="status",
-            text="Connected to STT service",
-            timestamp=datetime.now().isoformat()
-        ))
+        self._send_raw(_MSG_CONNECTED % now_iso())
     
     async def disconnect(self):
         """Handle WebSocket disconnection"""
         if self.current_connection:
             self.current_connection = None
             self.connection_status = None
+            self._stop_writer()
             self._reset_audio_state()
             
             if Config.VERBOSE:
@@ -91,9 +133,9 @@ class WebSocketHandler:
             else:
                 # Control message
                 try:
-                    data = json.loads(message)
+                    data = _json_loads(message)
                     await self._handle_control_message(data)
-                except json.JSONDecodeError:
+                except ValueError:
                     if Config.VERBOSE:
                         LOGGER.warning("Received invalid JSON message")
         
@@ -108,26 +150,23 @@ class WebSocketHandler:
         action = data.get("action")
         
         if action == "start":
+            # Opt-in: UTF-8 JSON in binary frames skips text-frame validation on both ends
+            self._binary_json = bool(data.get("binary_json", False))
             self._reset_audio_state()
-            await self._send_message(TranscriptionResponse(
-                type="status",
-                text="Ready to receive audio",
-                timestamp=datetime.now().isoformat()
-            ))
+            self._send_raw(_MSG_READY % now_iso())
             if Config.VERBOSE:
                 LOGGER.info("Audio recording started")
         
         elif action == "stop":
-            if self.is_speaking and self.speech_frames:
+            # Classify frames still waiting for a full VAD batch
+            await self._flush_vad_batch()
+            
+            if self.is_speaking and self._speech_len:
                 # Send final transcription for remaining audio
                 await self._process_final_transcription()
             
             self._reset_audio_state()
-            await self._send_message(TranscriptionResponse(
-                type="status",
-                text="Audio recording stopped",
-                timestamp=datetime.now().isoformat()
-            ))
+            self._send_raw(_MSG_STOPPED % now_iso())
             if Config.VERBOSE:
                 LOGGER.info("Audio recording stopped")
         
@@ -140,73 +179,142 @@ class WebSocketHandler:
         if not self.current_connection:
             return
         
-        # Add to buffer
-        self.audio_buffer.append(audio_data)
+        self._frames_buffered += 1
+        self._frames_processed += 1
         
-        # Voice activity detection
-        has_speech, rms_value = self.vad_processor.is_speech(audio_data)
-        
-        if has_speech:
-            await self._handle_speech_detected(audio_data)
+        if self._vad_batch_bytes > self._frame_bytes and len(audio_data) == self._frame_bytes:
+            # Collect full frames and classify them in a single VAD call
+            end = self._vad_accum_len + self._frame_bytes
+            self._vad_accum[self._vad_accum_len:end] = audio_data
+            self._vad_accum_len = end
+            if end >= self._vad_batch_bytes:
+                await self._flush_vad_batch()
         else:
-            await self._handle_silence_detected(audio_data)
+            # Odd-sized chunk: process pending frames first to keep the audio in order
+            await self._flush_vad_batch()
+            
+            # Voice activity detection
+            has_speech, rms_value = self.vad_processor.is_speech(audio_data)
+            
+            if has_speech:
+                await self._handle_speech_detected(audio_data)
+            else:
+                await self._handle_silence_detected(audio_data)
+    
+    async def _flush_vad_batch(self):
+        """Run VAD over the accumulated frames and handle each frame's decision in order"""
+        n = self._vad_accum_len
+        if not n:
+            return
+        self._vad_accum_len = 0
+        
+        # Frames are read in place; the handlers copy what they keep before the buffer is refilled
+        view = memoryview(self._vad_accum)[:n]
+        frames = np.frombuffer(view, dtype=np.int16).reshape(-1, Config.CHUNK_SIZE)
+        decisions, _ = self.vad_processor.is_speech_batch(frames)
+        
+        start = 0
+        if not self.is_speaking:
+            # Silence outside an utterance is a no-op, so jump straight to the first speech frame
+            if not decisions.any():
+                return
+            start = int(decisions.argmax())
         
-        # Update connection status
-        if self.connection_status:
-            self.connection_status.frames_processed += 1
-            self.connection_status.is_speaking = self.is_speaking
+        # Per-frame decisions keep MIN_SPEECH_FRAMES / SILENCE_COUNT_THRESHOLD counted in frames
+        frame_bytes = self._frame_bytes
+        for k, has_speech in enumerate(decisions[start:].tolist(), start):
+            frame = view[k * frame_bytes:(k + 1) * frame_bytes]
+            if has_speech:
+                await self._handle_speech_detected(frame)
+            else:
+                await self._handle_silence_detected(frame)
     
     async def _handle_speech_detected(self, audio_data: bytes):
         """Handle speech detection"""
         if not self.is_speaking:
             # Speech started
             self.is_speaking = True
-            self.speech_frames.clear()
+            self._utterance_id += 1
+            self._speech_len = 0
+            self.speech_frame_count = 0
             self.silence_count = 0
-            self.last_partial_time = time.time()
+            self.last_partial_time = time.monotonic()
             
-            await self._send_message(TranscriptionResponse(
-                type="speech_start",
-                timestamp=datetime.now().isoformat()
-            ))
+            self._send_raw(_MSG_SPEECH_START % now_iso())
             
-            if Config.VERBOSE:
-                LOGGER.info("Speech started")
+            self._logv("Speech started")
         
         # Add frame to speech buffer
-        self.speech_frames.append(audio_data)
+        self._append_speech(audio_data)
+        self.speech_frame_count += 1
         self.silence_count = 0
         
+        # Cut off runaway utterances (e.g. steady noise above the threshold) to bound memory
+        if self._speech_len >= self._max_speech_bytes:
+            await self._process_final_transcription()
+            await self._end_speech_session()
+            return
+        
         # Check for partial transcription
-        current_time = time.time()
+        current_time = time.monotonic()
         if (current_time - self.last_partial_time >= Config.PARTIAL_INTERVAL and 
-            len(self.speech_frames) > Config.MIN_SPEECH_FRAMES):
+            self.speech_frame_count > Config.MIN_SPEECH_FRAMES):
             
-            await self._process_partial_transcription()
-            self.last_partial_time = current_time
+            # Run in the background so audio keeps flowing while the model decodes
+            if self._start_partial_transcription():
+                self.last_partial_time = current_time
     
     async def _handle_silence_detected(self, audio_data: bytes):
         """Handle silence detection"""
         if self.is_speaking:
             self.silence_count += 1
-            self.speech_frames.append(audio_data)  # Keep some silence for context
+            self._append_speech(audio_data)  # Keep some silence for context
+            self.speech_frame_count += 1
             
             # Check if speech has ended
             if self.silence_count >= Config.SILENCE_COUNT_THRESHOLD:
                 await self._process_final_transcription()
                 await self._end_speech_session()
     
-    async def _process_partial_transcription(self):
-        """Process partial transcription"""
-        if not self.speech_frames:
-            return
+    def _append_speech(self, audio_data: bytes):
+        """Copy a frame into the speech buffer, growing it if the utterance outlasts its capacity"""
+        end = self._speech_len + len(audio_data)
+        if end > len(self._speech_buf):
+            # Only odd-sized chunks can overshoot the cap; grow by replacement, so views handed out of the old buffer stay valid
+            grown = bytearray(max(end, 2 * len(self._speech_buf)))
+            grown[:self._speech_len] = memoryview(self._speech_buf)[:self._speech_len]
+            self._speech_buf = grown
+        self._speech_buf[self._speech_len:end] = audio_data
+        self._speech_len = end
+    
+    def _start_partial_transcription(self) -> bool:
+        """Schedule a partial transcription of the recent audio, unless one is still running"""
+        if not self._speech_len:
+            return False
+        
+        # Skip instead of cancelling: a cancelled task doesn't stop the model thread, which
+        # would keep reading the shared conversion buffer while the next partial refills it
+        if self._partial_task and not self._partial_task.done():
+            return False
         
+        # Zero-copy view of the recent audio. Bytes before the cursor only change once the next
+        # utterance rewinds it, and partials of a finished utterance are discarded anyway; growing
+        # the buffer replaces it, so the view never blocks a resize
+        start = max(0, self._speech_len - self._partial_window_bytes)
+        recent_audio = memoryview(self._speech_buf)[start:self._speech_len]
+        self._partial_task = asyncio.create_task(
+            self._process_partial_transcription(recent_audio, self._utterance_id)
+        )
+        return True
+    
+    async def _process_partial_transcription(self, recent_audio: memoryview, utterance_id: int):
+        """Process partial transcription"""
         try:
-            # Use recent frames for partial transcription
-            recent_frames = self.speech_frames[-60:]  # Last ~3 seconds
-            response = await self.stt_service.transcribe_partial(recent_frames)
+            with recent_audio:
+                response = await self.stt_service.transcribe_partial(recent_audio)
             
-            if response.text:  # Only send if there's actual text
+            # Only send if there's actual text and the utterance hasn't been finalized meanwhile
+            if response.text and self.is_speaking and utterance_id == self._utterance_id:
                 await self._send_message(response)
         
         except Exception as e:
@@ -214,11 +322,12 @@ class WebSocketHandler:
     
     async def _process_final_transcription(self):
         """Process final transcription"""
-        if not self.speech_frames:
+        if not self._speech_len:
             return
         
         try:
-            response = await self.stt_service.transcribe_final(self.speech_frames)
+            with memoryview(self._speech_buf)[:self._speech_len] as speech_audio:
+                response = await self.stt_service.transcribe_final(speech_audio)
             await self._send_message(response)
         
         except Exception as e:
@@ -227,51 +336,133 @@ class WebSocketHandler:
     async def _end_speech_session(self):
         """End current speech session"""
         self.is_speaking = False
-        self.speech_frames.clear()
+        self._speech_len = 0
+        self.speech_frame_count = 0
         self.silence_count = 0
         
-        await self._send_message(TranscriptionResponse(
-            type="speech_end",
-            timestamp=datetime.now().isoformat()
-        ))
+        self._send_raw(_MSG_SPEECH_END % now_iso())
         
-        if Config.VERBOSE:
-            LOGGER.info("Speech ended")
+        self._logv("Speech ended")
+    
+    def _send_raw(self, message: str):
+        """Queue an already serialized message for the writer task"""
+        if self.current_connection and self._out_queue is not None:
+            self._enqueue(message.encode() if self._binary_json else message, droppable=False)
     
     async def _send_message(self, response: TranscriptionResponse):
-        """Send message to client"""
-        if not self.current_connection:
+        """Queue message for the writer task"""
+        if not self.current_connection or self._out_queue is None:
             return
         
+        self._enqueue(
+            response.to_json_bytes() if self._binary_json else response.to_json(),
+            droppable=response.type == "partial"
+        )
+        
+        if response.type != "error":
+            self._logv("Sent %s: %s", response.type, response.text)
+    
+    def _enqueue(self, message, droppable: bool):
+        """Queue a message without waiting; a full queue means the client stopped reading"""
+        if droppable:
+            # Latest partial wins: replace one still waiting in the queue, as long as
+            # nothing else was queued after it (keeps ordering against speech_end/final)
+            slot = self._partial_slot
+            if slot is not None and slot[0] is not None:
+                slot[0] = message
+                return
+            message = self._partial_slot = [message]
+        else:
+            self._partial_slot = None
+        
         try:
-            message = response.model_dump_json()
-            await self.current_connection.send_text(message)
+            self._out_queue.put_nowait(message)
+        except asyncio.QueueFull:
+            if droppable:
+                self._partial_slot = None
+                self._logv("Send queue full, dropped partial")
+                return
             
-            if Config.VERBOSE and response.type in ["partial", "final"]:
-                LOGGER.info(f"Sent {response.type}: {response.text}")
+            # Finals and status events can't be dropped: close the laggard instead of stalling audio
+            LOGGER.warning("Client is not reading messages, closing connection")
+            websocket = self.current_connection
+            self._stop_writer()
+            self._close_task = asyncio.create_task(self._close_slow_client(websocket))
+    
+    @staticmethod
+    async def _close_slow_client(websocket: WebSocket):
+        """Close a client whose send queue overflowed (the receive loop then disconnects it)"""
+        try:
+            await websocket.close(code=1013)  # Try again later
+        except Exception as e:
+            if Config.VERBOSE:
+                LOGGER.warning(f"Error closing slow client: {e}")
+    
+    async def _writer_loop(self, websocket: WebSocket, queue: asyncio.Queue):
+        """Send queued messages to the client in order"""
+        try:
+            while True:
+                message = await queue.get()
+                await self._send_frame(websocket, message)
+                
+                # Flush whatever was queued meanwhile in one go. Each message keeps its own
+                # frame: clients parse every frame as a single JSON object
+                while not queue.empty():
+                    await self._send_frame(websocket, queue.get_nowait())
         
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             LOGGER.error(f"Error sending message: {e}")
-            await self.disconnect()
+            if self.current_connection is websocket:
+                await self.disconnect()
+    
+    @staticmethod
+    async def _send_frame(websocket: WebSocket, message):
+        """Send one serialized message (bytes for binary_json clients, str otherwise)"""
+        if type(message) is list:
+            # Partial slot: take the latest partial and close the slot to further overwrites
+            slot = message
+            message = slot[0]
+            slot[0] = None
+        
+        if isinstance(message, bytes):
+            await websocket.send_bytes(message)
+        else:
+            await websocket.send_text(message)
+    
+    def _stop_writer(self):
+        """Cancel the writer task of the current connection"""
+        task = self._writer_task
+        self._writer_task = None
+        self._out_queue = None
+        self._partial_slot = None
+        if task and task is not asyncio.current_task():
+            task.cancel()
     
     async def _send_error(self, error_message: str):
         """Send error message to client"""
         await self._send_message(TranscriptionResponse(
             type="error",
-            timestamp=datetime.now().isoformat(),
+            timestamp=now_iso(),
             error_message=error_message
         ))
     
     def _reset_audio_state(self):
         """Reset all audio processing state"""
-        self.audio_buffer.clear()
+        # Every frame bumps _frames_buffered before touching any other state, so zero means already clean
+        if not self._frames_buffered:
+            return
+        
+        self._frames_buffered = 0
+        self._vad_accum_len = 0
         self.is_speaking = False
-        self.speech_frames.clear()
+        self._speech_len = 0
+        self.speech_frame_count = 0
         self.silence_count = 0
         self.last_partial_time = 0.0
         
-        if Config.VERBOSE:
-            LOGGER.info("Audio state reset")
+        self._logv("Audio state reset")
     
     def get_status(self) -> dict:
         """Get current connection status"""
@@ -281,9 +472,9 @@ class WebSocketHandler:
         return {
             "connected": True,
             "client_id": self.connection_status.client_id,
-            "connected_at": self.connection_status.connected_at.isoformat(),
-            "is_speaking": self.connection_status.is_speaking,
-            "frames_processed": self.connection_status.frames_processed,
-            "buffer_size": len(self.audio_buffer),
-            "speech_frames": len(self.speech_frames)
+            "connected_at": self.connection_status.connected_at,
+            "is_speaking": self.is_speaking,
+            "frames_processed": self._frames_processed,
+            "buffer_size": min(self._frames_buffered, Config.MAX_AUDIO_BUFFER),
+            "speech_frames": self.speech_frame_count
         }
\ No newline at end of file